@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Extractor Benchmark Suite
+
+Generates synthetic builds with synthetic_pe.py (or reuses a corpus
+directory of them) and times each stage of the extract_addresses.py
+pipeline on them, reporting throughput in MB/s and peak traced memory,
+then checks that the planted addresses were recovered.
+
+Usage:
+    python bench_extract.py [--sizes 1,10,100] [--corpus DIR]
+                            [--scanners numpy,python,parallel] [--json out.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import extract_addresses as ea
+import synthetic_pe
+
+MB = 1 << 20
+
+
+def _measure(fn, trace_memory):
+    """Run fn with its output discarded; return (result, seconds, peak bytes)."""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _stages(path, scanners):
+    """Yield (stage name, bytes processed, callable) for one build.
+
+    The callables share state through a dict so later stages reuse the
+    indices and references found by earlier ones.
+    """
+    state = {}
+
+    yield 'load', path.stat().st_size, lambda: ea.PEFile(path)
+    pe = ea.PEFile(path)
+    text_sec = pe.get_section('.text')
+    rdata_sec = pe.get_section('.rdata')
+    data_sec = pe.get_section('.data')
+
+    yield 'md5', pe.file_size(), lambda: ea.PEFile(path).md5()
+
+    def indices():
+        state['indices'] = ea.find_variable_indices(pe)
+        return state['indices']
+
+    yield ('variable_indices', rdata_sec['raw_size'] + data_sec['raw_size'],
+           indices)
+    yield 'dump_globals', data_sec['raw_size'], lambda: ea.dump_globals(pe)
+
+    for scanner in scanners:
+        def scan(scanner=scanner):
+            if scanner == 'parallel':
+                refs = ea.find_all_rip_refs_parallel(pe, text_sec, jobs=None)
+            else:
+                refs = ea.find_all_rip_refs(pe.section_data(text_sec),
+                                            text_sec['virtual_address'],
+                                            use_numpy=scanner == 'numpy')
+            state['refs'] = refs
+            return refs
+
+        yield f'text_scan[{scanner}]', text_sec['raw_size'], scan
+
+    def global_data():
+        state['globalData'] = ea.find_global_data(pe, state['indices'],
+                                                  state['refs'])
+        return state['globalData']
+
+    yield 'global_data', text_sec['raw_size'], global_data
+
+
+def bench_file(path, scanners, trace_memory=True):
+    """Benchmark every stage on one build; return a JSON-able report."""
+    manifest = json.loads(Path(f"{path}.json").read_text())
+    report = {'path': str(path), 'textSize': manifest['textSize'],
+              'stages': [], 'errors': []}
+
+    results = {}
+    for name, size, fn in _stages(path, scanners):
+        result, elapsed, _ = _measure(fn, False)
+        peak = _measure(fn, True)[2] if trace_memory else None
+        results[name] = result
+        report['stages'].append({
+            'stage': name, 'seconds': round(elapsed, 4),
+            'mbPerSec': round(size / MB / elapsed, 1) if elapsed else None,
+            'peakBytes': peak,
+        })
+
+    # Correctness: every planted address must be recovered
+    expected = manifest['addresses']
+    found = dict(results['variable_indices'])
+    found['globalData'] = results['global_data']
+    if found['globalData']:
+        found['room'] = found['globalData'] + ea.ROOM_OFFSET
+    for key, rva in expected.items():
+        if found.get(key) != rva:
+            report['errors'].append(f"{key}: expected 0x{rva:x},"
+                                    f" got {found.get(key)}")
+    if len(results['dump_globals']) < manifest['globals']:
+        report['errors'].append(f"dump_globals found"
+                                f" {len(results['dump_globals'])}"
+                                f"/{manifest['globals']} globals")
+
+    scans = {name: results[name] for name in results
+             if name.startswith('text_scan')}
+    reference = next(iter(scans.values()))
+    for name, refs in scans.items():
+        if (refs.inst_rvas != reference.inst_rvas
+                or refs.targets != reference.targets):
+            report['errors'].append(f"{name} disagrees with"
+                                    f" {next(iter(scans))}")
+    return report
+
+
+def print_report(report):
+    print(f"{Path(report['path']).name}"
+          f" (.text {report['textSize'] / MB:.0f} MB)")
+    for s in report['stages']:
+        peak = (f"{s['peakBytes'] / MB:9.1f} MB" if s['peakBytes'] is not None
+                else '')
+        print(f"  {s['stage']:22s} {s['seconds']:9.3f} s"
+              f" {s['mbPerSec'] or 0:9.1f} MB/s {peak}")
+    if report['errors']:
+        for error in report['errors']:
+            print(f"  FAIL  {error}")
+    else:
+        print("  All planted addresses recovered")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark extract_addresses.py on synthetic builds")
+    parser.add_argument('--sizes', default='1,10,100',
+                        help='Comma-separated .text sizes in MB'
+                             ' (default: 1,10,100)')
+    parser.add_argument('--corpus',
+                        help='Directory to write/reuse synthetic builds in'
+                             ' (default: a temporary directory)')
+    parser.add_argument('--scanners', default='numpy,python,parallel',
+                        help='Comma-separated .text scanners to time')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Skip the second, tracemalloc-instrumented run'
+                             ' of each stage')
+    parser.add_argument('--json', help='Also write the reports to this file')
+    args = parser.parse_args()
+
+    scanners = [s for s in args.scanners.split(',') if s]
+    if 'numpy' in scanners and ea.np is None:
+        print("NumPy not installed; skipping the numpy scanner")
+        scanners.remove('numpy')
+    if not scanners:
+        parser.error("no scanners to run")
+
+    with contextlib.ExitStack() as stack:
+        if args.corpus:
+            corpus = Path(args.corpus)
+            corpus.mkdir(parents=True, exist_ok=True)
+        else:
+            corpus = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+
+        reports = []
+        for size in args.sizes.split(','):
+            path = corpus / f"synthetic_{size}mb_{args.seed}.exe"
+            if not path.exists() or not Path(f"{path}.json").exists():
+                print(f"Generating {path.name}...")
+                synthetic_pe.build(path, text_size=int(float(size) * MB),
+                                   seed=args.seed)
+            report = bench_file(path, scanners,
+                                trace_memory=not args.no_memory)
+            print_report(report)
+            reports.append(report)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(reports, indent=1) + '\n')
+    if any(r['errors'] for r in reports):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
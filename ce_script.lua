@@ -4,6 +4,7 @@
 
 -- Configuration for different game versions
 local versions = {
+    -- <generated:versions> by generate_splitter.py from extract_addresses.KNOWN_VERSIONS
     ["1.1.01 Hotfix 2 (Steam)"] = {
         globalDataHashMap = 0x1A1D450,
         arrayStageClearIndex = 0x19B63F8,
@@ -60,6 +61,7 @@ local versions = {
         globalDataHashMap = 0x1A05060,
         arrayStageClearIndex = 0x199E428
     }
+    -- </generated:versions>
 }
 
 -- RValue type constants
@@ -8,16 +8,48 @@ previously required manual reverse engineering with Ghidra/IDA.
 
 Usage:
     python extract_addresses.py Windswept.exe [--version-name "1.2.0 (Steam)"]
+    python extract_addresses.py Windswept.exe --identify
+    python extract_addresses.py builds/ [more.exe ...] [--jobs N] > results.jsonl
+    python extract_addresses.py Windswept.exe --force --profile [--metrics-json m.json]
+
+As a library, extract(path_or_buffer) returns an ExtractionResult without
+printing anything.
 """
 
 import argparse
 import bisect
+import contextlib
+import cProfile
 import hashlib
+import json
+import logging
+import mmap
+import os
+import re
 import struct
 import sys
+import threading
+import time
+import tracemalloc
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from pathlib import Path
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional; falls back to the pure-Python scanner.
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows; peak RSS is skipped.
+
+# Pipeline progress goes here; main() prints INFO and above to stdout.
+log = logging.getLogger('extract_addresses')
+
 # Variable names to find and their ASL field names
 VARIABLES = [
     ("array_StageClears", "arrayStageClearIndex"),
@@ -39,7 +71,42 @@ SENTINEL = b'\xff\xff\xff\xff\x00\x00\x00\x00'
 # Constant across all 10 known versions (1.0.7 through 1.1.01 Hotfix 2).
 ROOM_OFFSET = 0x31C828
 
+# Every address the tool extracts, in output order.
+ADDRESS_KEYS = ['room', 'globalData'] + [an for _, an in VARIABLES]
+
+# Binary globals index (see write_globals_index): header, then
+# (index_rva, name_offset) records sorted by name, then a name blob.
+GLOBALS_MAGIC = b'WSGI'
+GLOBALS_VERSION = 1
+GLOBALS_HEADER = struct.Struct('<4sHH16sII')
+GLOBALS_RECORD = struct.Struct('<II')
+
+# Enough of the file to cover the DOS, COFF and optional headers and the
+# section table.
+HEADER_READ_SIZE = 0x1000
+
+# Serialized RefIndex (see RefIndex.to_bytes).
+REFS_MAGIC = b'WSRI'
+REFS_HEADER = struct.Struct('<4sI')
+
+# Cached addresses are discarded when this changes; bump it whenever the
+# extraction heuristics change. Cached RefIndexes stay valid regardless.
+HEURISTICS_VERSION = 1
+DEFAULT_CACHE_DIR = (Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+                     / 'windswept_autosplit')
+DEFAULT_CACHE_MB = 512
+
+# Delta-guided extraction (see run_delta_extraction): how far either side
+# of a seed build's RVA to search, how much .text to scan between
+# GlobalData checks, and how many variables GlobalData must be near to
+# be accepted before the whole of .text has been scanned.
+DELTA_WINDOW = 0x40000
+DELTA_TEXT_CHUNK = 1 << 20
+DELTA_MIN_VOTES = 4
+
 # Known versions: MD5 hash -> expected addresses (for validation).
+# windswept.asl's state/init blocks and ce_script.lua's version table are
+# generated from this by generate_splitter.py.
 KNOWN_VERSIONS = {
     "D288C9A5FFD5C01F125AD0695CDD6649": {
         "name": "1.0.7 (Steam)", "moduleSize": 31907840,
@@ -124,12 +191,51 @@ KNOWN_VERSIONS = {
 
 
 class PEFile:
-    """Minimal PE64 parser for section mapping and RVA conversion."""
+    """Minimal PE64 parser for section mapping and RVA conversion.
+
+    By default the file is memory-mapped read-only and section_data()
+    returns memoryview slices over the mapping, so no section is copied.
+    Pass use_mmap=False to read the whole file into memory instead, or
+    headers_only=True to read just the headers (no section data; md5()
+    then streams the file). path may also be an in-memory buffer (bytes,
+    bytearray, memoryview or mmap), which is used as-is; path is then
+    None.
+    """
 
-    def __init__(self, path):
-        self.data = Path(path).read_bytes()
+    def __init__(self, path, use_mmap=True, headers_only=False):
+        self.headers_only = headers_only
+        self._md5 = None
+        if isinstance(path, (bytes, bytearray, memoryview, mmap.mmap)):
+            self.path = None
+            self.headers_only = False
+            self.data = path
+            self._file_size = len(path)
+            self._parse()
+            return
+
+        self.path = Path(path)
+        self._file_size = self.path.stat().st_size
+        if headers_only:
+            with open(path, 'rb') as f:
+                self.data = f.read(HEADER_READ_SIZE)
+        elif use_mmap:
+            with open(path, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = Path(path).read_bytes()
         self._parse()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the mapping. Section views must be released first."""
+        if self.path is not None and isinstance(self.data, mmap.mmap):
+            self.data.close()
+
     def _parse(self):
         if self.data[:2] != b'MZ':
             raise ValueError("Not a valid PE file (missing MZ signature)")
@@ -138,7 +244,8 @@ class PEFile:
             raise ValueError("Not a valid PE file (missing PE signature)")
 
         coff = e_lfanew + 4
-        machine, num_sections = struct.unpack_from('<HH', self.data, coff)
+        machine, num_sections, self.timestamp = struct.unpack_from(
+            '<HHI', self.data, coff)
         opt_size = struct.unpack_from('<H', self.data, coff + 16)[0]
         if machine != 0x8664:
             raise ValueError(f"Not a 64-bit PE (machine=0x{machine:04x})")
@@ -149,12 +256,13 @@ class PEFile:
 
         self.image_base = struct.unpack_from('<Q', self.data, opt + 24)[0]
         self.size_of_image = struct.unpack_from('<I', self.data, opt + 56)[0]
+        self.checksum = struct.unpack_from('<I', self.data, opt + 64)[0]
 
         self.sections = []
         sec_off = opt + opt_size
         for i in range(num_sections):
             o = sec_off + i * 40
-            name = self.data[o:o + 8].split(b'\x00')[0].decode('ascii', errors='replace')
+            name = bytes(self.data[o:o + 8]).split(b'\x00')[0].decode('ascii', errors='replace')
             vsize, vaddr, rsize, roff = struct.unpack_from('<IIII', self.data, o + 8)
             self.sections.append({
                 'name': name, 'virtual_size': vsize, 'virtual_address': vaddr,
@@ -168,21 +276,178 @@ class PEFile:
         return None
 
     def section_data(self, section):
+        """Zero-copy memoryview of a section's raw bytes."""
+        if self.headers_only:
+            raise ValueError("PEFile was opened with headers_only=True")
         o, sz = section['raw_offset'], section['raw_size']
-        return self.data[o:o + sz]
+        return memoryview(self.data)[o:o + sz]
 
     def rva_in_section(self, rva, section):
         return (section['virtual_address'] <= rva <
                 section['virtual_address'] + section['virtual_size'])
 
     def md5(self):
-        return hashlib.md5(self.data).hexdigest().upper()
+        if self._md5 is None:
+            if self.headers_only:
+                self._md5 = md5_file(self.path)
+            else:
+                self._md5 = hashlib.md5(self.data).hexdigest().upper()
+        return self._md5
 
     def file_size(self):
-        return len(self.data)
+        return self._file_size
+
+
+def md5_file(path, chunk_size=1 << 20):
+    """MD5 of a file, read in chunks so it never sits in memory whole."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest().upper()
+
+
+def build_version_index(known=KNOWN_VERSIONS):
+    """Map SizeOfImage -> MD5s of known versions with that module size."""
+    index = defaultdict(list)
+    for md5_hash, info in known.items():
+        index[info['moduleSize']].append(md5_hash)
+    return dict(index)
+
+
+VERSION_INDEX = build_version_index()
 
 
-def find_all_rip_refs(text_data, text_rva):
+def identify_known_version(path):
+    """Identify a known build from its headers, hashing only if needed.
+
+    Candidates are narrowed by SizeOfImage (and by 'timestamp' /
+    'checksum' for KNOWN_VERSIONS entries that record them) before the
+    file is hashed, so unknown builds usually return without reading
+    past the headers. Returns (md5, header-only PEFile) for a known
+    build, or (None, header-only PEFile) otherwise.
+    """
+    pe = PEFile(path, headers_only=True)
+    candidates = [
+        md5_hash for md5_hash in VERSION_INDEX.get(pe.size_of_image, [])
+        if KNOWN_VERSIONS[md5_hash].get('timestamp', pe.timestamp) == pe.timestamp
+        and KNOWN_VERSIONS[md5_hash].get('checksum', pe.checksum) == pe.checksum
+    ]
+    if candidates and pe.md5() in candidates:
+        return pe.md5(), pe
+    return None, pe
+
+
+# ModRM bytes with mod=00, rm=101 (RIP-relative): 0x05, 0x0D, 0x15, ..., 0x3D
+RIP_MODRM = frozenset(range(0x05, 0x40, 8))
+
+# Zero-width patterns so re.finditer reports overlapping candidates; re
+# works on any buffer (bytes, mmap, memoryview) without copying it.
+_MODRM_CLASS = b'[' + re.escape(bytes(sorted(RIP_MODRM))) + b']'
+_RIP7_RE = re.compile(rb'(?=[\x48\x4C][\x8B\x8D]' + _MODRM_CLASS + rb')')
+_RIP6_RE = re.compile(rb'(?=[\x8B\x8D]' + _MODRM_CLASS + rb')')
+
+
+class RefIndex:
+    """Compact index of RIP-relative references.
+
+    Stores (instruction_rva, target_rva) pairs as two parallel uint32
+    arrays sorted by instruction RVA, plus a second pair sorted by target
+    so both "who references X" and "what is referenced near Y" are a
+    bisect away. No per-reference Python objects are kept.
+    """
+
+    def __init__(self, inst_rvas, targets, by_target_keys, by_target_insts):
+        self.inst_rvas = inst_rvas
+        self.targets = targets
+        self._by_target_keys = by_target_keys
+        self._by_target_insts = by_target_insts
+
+    @classmethod
+    def build(cls, inst_rvas, targets):
+        """Build an index from unsorted parallel sequences of RVAs."""
+        if np is not None:
+            inst = np.asarray(inst_rvas, dtype=np.uint32)
+            tgt = np.asarray(targets, dtype=np.uint32)
+            order = np.argsort(inst, kind='stable')
+            return cls.from_sorted(_u32_array(inst[order]),
+                                   _u32_array(tgt[order]))
+
+        order = sorted(range(len(inst_rvas)), key=inst_rvas.__getitem__)
+        return cls.from_sorted(array('I', (inst_rvas[i] for i in order)),
+                               array('I', (targets[i] for i in order)))
+
+    @classmethod
+    def from_sorted(cls, inst, tgt):
+        """Build an index from array('I') columns already sorted by inst."""
+        if np is not None:
+            order = np.argsort(np.frombuffer(tgt, dtype=np.uint32),
+                               kind='stable')
+            np_inst = np.frombuffer(inst, dtype=np.uint32)
+            np_tgt = np.frombuffer(tgt, dtype=np.uint32)
+            return cls(inst, tgt, _u32_array(np_tgt[order]),
+                       _u32_array(np_inst[order]))
+
+        order = sorted(range(len(tgt)), key=tgt.__getitem__)
+        return cls(inst, tgt,
+                   array('I', (tgt[i] for i in order)),
+                   array('I', (inst[i] for i in order)))
+
+    def to_bytes(self):
+        """Serialize as magic, count, then the inst and target columns (LE)."""
+        inst, tgt = array('I', self.inst_rvas), array('I', self.targets)
+        if sys.byteorder == 'big':
+            inst.byteswap()
+            tgt.byteswap()
+        return (REFS_HEADER.pack(REFS_MAGIC, len(inst))
+                + inst.tobytes() + tgt.tobytes())
+
+    @classmethod
+    def from_bytes(cls, raw):
+        """Inverse of to_bytes; the target lookup is rebuilt on load."""
+        magic, count = REFS_HEADER.unpack_from(raw)
+        if magic != REFS_MAGIC:
+            raise ValueError("Not a serialized RefIndex")
+        start = REFS_HEADER.size
+        inst, tgt = array('I'), array('I')
+        inst.frombytes(raw[start:start + count * 4])
+        tgt.frombytes(raw[start + count * 4:start + count * 8])
+        if len(tgt) != count:
+            raise ValueError("Truncated RefIndex")
+        if sys.byteorder == 'big':
+            inst.byteswap()
+            tgt.byteswap()
+        return cls.from_sorted(inst, tgt)
+
+    def __len__(self):
+        return len(self.inst_rvas)
+
+    def __iter__(self):
+        return zip(self.inst_rvas, self.targets)
+
+    def refs_to(self, target):
+        """Instruction RVAs that reference target (ascending)."""
+        left = bisect.bisect_left(self._by_target_keys, target)
+        right = bisect.bisect_right(self._by_target_keys, target)
+        return self._by_target_insts[left:right]
+
+    def window(self, lo, hi):
+        """Return the (start, stop) slice of references with lo <= inst <= hi.
+
+        Index self.inst_rvas / self.targets with the returned bounds.
+        """
+        return (bisect.bisect_left(self.inst_rvas, lo),
+                bisect.bisect_right(self.inst_rvas, hi))
+
+
+def _u32_array(values):
+    """Copy a NumPy uint32 array into a compact array('I')."""
+    out = array('I')
+    out.frombytes(values.astype(np.uint32).tobytes())
+    return out
+
+
+def find_all_rip_refs(text_data, text_rva, use_numpy=None):
     """Extract all RIP-relative MOV/LEA references from .text.
 
     Scans for two instruction forms:
@@ -190,104 +455,382 @@ def find_all_rip_refs(text_data, text_rva):
     - 7-byte (REX.W):  REX opcode ModRM disp32  (for 64-bit operands like pointers)
 
     ModRM must have mod=00, rm=101 for RIP-relative addressing.
-    Returns list of (instruction_rva, target_rva).
+    Uses the NumPy scanner when available unless use_numpy is False.
+    Returns a RefIndex.
     """
-    refs = []
-    # ModRM bytes with mod=00, rm=101: 0x05, 0x0D, 0x15, ..., 0x3D
-    valid_modrm = frozenset(range(0x05, 0x40, 8))
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        if np is None:
+            raise RuntimeError("NumPy scanner requested but numpy is not installed")
+        inst_rvas, targets = _scan_rip_refs_numpy(text_data, text_rva)
+    else:
+        inst_rvas, targets = _scan_rip_refs_python(text_data, text_rva)
+    return RefIndex.build(inst_rvas, targets)
+
+
+# Bytes past a chunk's end a worker must see to decode an instruction that
+# starts inside it: the longest form is 7 bytes, so at most 6 spill over.
+CHUNK_OVERLAP = 6
+MIN_CHUNK_SIZE = 1 << 20
+
+
+def find_all_rip_refs_parallel(pe, text_sec, jobs=None, use_numpy=None):
+    """find_all_rip_refs split across worker processes.
+
+    .text is cut into chunks; each worker memory-maps the exe itself and
+    scans its chunk plus CHUNK_OVERLAP trailing bytes (and one leading
+    byte for the REX check), keeping only instructions that start inside
+    the chunk. No section bytes are pickled, and the per-chunk arrays are
+    merged into one RefIndex. PEFiles over in-memory buffers are scanned
+    in-process.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    length = text_sec['raw_size']
+    chunk = max(MIN_CHUNK_SIZE, -(-length // (jobs * 4)))
+    bounds = [(start, min(start + chunk, length))
+              for start in range(0, length, chunk)]
+    if jobs == 1 or len(bounds) == 1 or pe.path is None:
+        return find_all_rip_refs(pe.section_data(text_sec),
+                                 text_sec['virtual_address'], use_numpy)
+
+    inst_rvas = array('I')
+    targets = array('I')
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_scan_text_chunk, str(pe.path),
+                               text_sec['raw_offset'], length,
+                               text_sec['virtual_address'], start, end,
+                               use_numpy)
+                   for start, end in bounds]
+        for future in futures:
+            chunk_insts, chunk_targets = future.result()
+            inst_rvas.extend(chunk_insts)
+            targets.extend(chunk_targets)
+    return RefIndex.build(inst_rvas, targets)
+
+
+def _scan_text_chunk(path, raw_offset, length, text_rva, start, end,
+                     use_numpy):
+    """Worker for find_all_rip_refs_parallel: scan .text[start:end]."""
+    if use_numpy is None:
+        use_numpy = np is not None
+    lo = max(start - 1, 0)
+    hi = min(end + CHUNK_OVERLAP, length)
+    first, stop = text_rva + start, text_rva + end
+
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        with memoryview(mapped)[raw_offset + lo:raw_offset + hi] as view:
+            if use_numpy:
+                insts, tgts = _scan_rip_refs_numpy(view, text_rva + lo)
+                keep = (insts >= first) & (insts < stop)
+                return _u32_array(insts[keep]), _u32_array(tgts[keep])
+            insts, tgts = _scan_rip_refs_python(view, text_rva + lo)
+    finally:
+        mapped.close()
+
+    keep = [i for i, rva in enumerate(insts) if first <= rva < stop]
+    return (array('I', (insts[i] for i in keep)),
+            array('I', (tgts[i] for i in keep)))
+
+
+def _scan_rip_refs_python(text_data, text_rva):
+    """Pure-Python scanner: regex for each instruction form, unpack per hit.
+
+    Returns (inst_rvas, targets) as parallel array('I'), 7-byte forms first.
+    """
+    inst_rvas = array('I')
+    targets = array('I')
 
     # 7-byte REX-prefixed: (48|4C) (8B|8D) ModRM disp32
-    limit7 = len(text_data) - 6
-    for rex in (0x48, 0x4C):
-        for opcode in (0x8B, 0x8D):
-            prefix = bytes([rex, opcode])
-            pos = 0
-            while True:
-                pos = text_data.find(prefix, pos)
-                if pos == -1 or pos > limit7:
-                    break
-                if text_data[pos + 2] in valid_modrm:
-                    disp = struct.unpack_from('<i', text_data, pos + 3)[0]
-                    inst_rva = text_rva + pos
-                    target = inst_rva + 7 + disp
-                    if target > 0:
-                        refs.append((inst_rva, target))
-                pos += 1
+    limit7 = len(text_data) - 7
+    for m in _RIP7_RE.finditer(text_data):
+        pos = m.start()
+        if pos > limit7:
+            break
+        disp = struct.unpack_from('<i', text_data, pos + 3)[0]
+        inst_rva = text_rva + pos
+        target = inst_rva + 7 + disp
+        if target > 0:
+            inst_rvas.append(inst_rva)
+            targets.append(target)
 
     # 6-byte non-REX: (8B|8D) ModRM disp32 (32-bit operand, used for indices)
-    limit6 = len(text_data) - 5
-    for opcode in (0x8B, 0x8D):
-        pos = 0
-        while True:
-            pos = text_data.find(bytes([opcode]), pos)
-            if pos == -1 or pos > limit6:
-                break
-            if text_data[pos + 1] in valid_modrm:
-                # Skip if preceded by a REX byte (already handled above)
-                if pos > 0 and 0x40 <= text_data[pos - 1] <= 0x4F:
-                    pos += 1
-                    continue
-                disp = struct.unpack_from('<i', text_data, pos + 2)[0]
-                inst_rva = text_rva + pos
-                target = inst_rva + 6 + disp
-                if target > 0:
-                    refs.append((inst_rva, target))
-            pos += 1
-
-    return refs
-
-
-def find_variable_indices(pe):
-    """Find variable index RVAs via string cross-references in .rdata/.data."""
+    limit6 = len(text_data) - 6
+    for m in _RIP6_RE.finditer(text_data):
+        pos = m.start()
+        if pos > limit6:
+            break
+        # Skip if preceded by a REX byte (already handled above)
+        if pos > 0 and 0x40 <= text_data[pos - 1] <= 0x4F:
+            continue
+        disp = struct.unpack_from('<i', text_data, pos + 2)[0]
+        inst_rva = text_rva + pos
+        target = inst_rva + 6 + disp
+        if target > 0:
+            inst_rvas.append(inst_rva)
+            targets.append(target)
+
+    return inst_rvas, targets
+
+
+def _scan_rip_refs_numpy(text_data, text_rva):
+    """NumPy scanner: match opcode/ModRM over the whole section at once.
+
+    Builds boolean masks for each byte class, ANDs shifted views of them to
+    find candidate instructions, then gathers the disp32 bytes for every hit
+    in bulk. Returns (inst_rvas, targets) as int64 arrays, 7-byte forms first.
+    """
+    buf = np.frombuffer(text_data, dtype=np.uint8)
+    n = len(buf)
+    if n < 6:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    is_opcode = (buf == 0x8B) | (buf == 0x8D)
+    is_modrm = (buf & 0xC7) == 0x05
+
+    # 7-byte REX-prefixed: positions 0..n-7
+    m7 = n - 6
+    is_rex = (buf[:m7] == 0x48) | (buf[:m7] == 0x4C)
+    pos7 = np.flatnonzero(is_rex & is_opcode[1:m7 + 1] & is_modrm[2:m7 + 2])
+
+    # 6-byte non-REX: positions 0..n-6, not preceded by any REX byte
+    m6 = n - 5
+    hit6 = is_opcode[:m6] & is_modrm[1:m6 + 1]
+    hit6[1:] &= (buf[:m6 - 1] & 0xF0) != 0x40
+    pos6 = np.flatnonzero(hit6)
+
+    def disp32(offsets):
+        d = (buf[offsets].astype(np.uint32)
+             | (buf[offsets + 1].astype(np.uint32) << 8)
+             | (buf[offsets + 2].astype(np.uint32) << 16)
+             | (buf[offsets + 3].astype(np.uint32) << 24))
+        return d.view(np.int32).astype(np.int64)
+
+    inst7 = pos7.astype(np.int64) + text_rva
+    tgt7 = inst7 + 7 + disp32(pos7 + 3)
+    inst6 = pos6.astype(np.int64) + text_rva
+    tgt6 = inst6 + 6 + disp32(pos6 + 2)
+
+    inst_rvas = np.concatenate((inst7, inst6))
+    targets = np.concatenate((tgt7, tgt6))
+    keep = targets > 0
+    return inst_rvas[keep], targets[keep]
+
+
+def find_variable_indices(pe, variables=VARIABLES):
+    """Find variable index RVAs via string cross-references in .rdata/.data.
+
+    One regex pass over .rdata locates every name, then one 8-byte-stride
+    sweep over .data matches pointer+SENTINEL slots against the set of
+    string VAs, so cost does not grow with the number of variables.
+    """
     rdata = pe.get_section('.rdata')
     data_sec = pe.get_section('.data')
     if not rdata or not data_sec:
-        print("  ERROR: Missing .rdata or .data section")
+        log.error("  ERROR: Missing .rdata or .data section")
         return {}
 
     rdata_bytes = pe.section_data(rdata)
     data_bytes = pe.section_data(data_sec)
-    results = {}
 
-    for var_name, asl_name in VARIABLES:
-        # Find the null-terminated string in .rdata
-        needle_str = var_name.encode('ascii') + b'\x00'
-        str_pos = rdata_bytes.find(needle_str)
-        if str_pos == -1:
-            print(f"  WARNING: '{var_name}' not found in .rdata")
+    # Find the first null-terminated occurrence of every name in .rdata
+    string_offsets = find_strings(rdata_bytes, [vn for vn, _ in variables])
+    string_vas = {}  # string VA (as stored in on-disk pointers) -> var name
+    for var_name, _ in variables:
+        if var_name not in string_offsets:
+            log.warning(f"  WARNING: '{var_name}' not found in .rdata")
             continue
+        va = pe.image_base + rdata['virtual_address'] + string_offsets[var_name]
+        string_vas[va] = var_name
 
-        # Compute VA of the string (as stored in on-disk pointers)
-        string_va = pe.image_base + rdata['virtual_address'] + str_pos
-        ptr_needle = struct.pack('<Q', string_va)
+    # Search .data for 8-byte pointers to those VAs followed by the sentinel
+    slots = find_name_slots(data_bytes, string_vas)
+
+    results = {}
+    for var_name, asl_name in variables:
+        if var_name not in string_offsets:
+            continue
+        if var_name not in slots:
+            log.warning(f"  WARNING: No index address found for '{var_name}'")
+            continue
+        index_rva = data_sec['virtual_address'] + slots[var_name] + 8
+        results[asl_name] = index_rva
+        log.info(f"  {var_name:25s} -> 0x{index_rva:x}")
 
-        # Search .data for 8-byte pointer to this string VA
-        found = False
-        search_pos = 0
-        while True:
-            match = data_bytes.find(ptr_needle, search_pos)
-            if match == -1:
+    return results
+
+
+def find_strings(buf, names):
+    """Return {name: offset} of the first null-terminated occurrence of each name.
+
+    All names are matched in a single pass with one regex alternation.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    pattern = re.compile(
+        b'(?=(' + b'|'.join(re.escape(n.encode('ascii') + b'\x00') for n in names)
+        + b'))')
+    found = {}
+    for m in pattern.finditer(buf):
+        name = m.group(1)[:-1].decode('ascii')
+        if name not in found:
+            found[name] = m.start()
+            if len(found) == len(names):
                 break
-            # Validate: next 8 bytes should be the uninitialized sentinel
-            sentinel_off = match + 8
-            if (sentinel_off + 8 <= len(data_bytes) and
-                    data_bytes[sentinel_off:sentinel_off + 8] == SENTINEL):
-                index_rva = data_sec['virtual_address'] + match + 8
-                results[asl_name] = index_rva
-                print(f"  {var_name:25s} -> 0x{index_rva:x}")
-                found = True
+    return found
+
+
+def iter_sentinel_slots(data_bytes):
+    """Yield (offset, pointer) for every 8-aligned word followed by SENTINEL.
+
+    This is the shape of a GameMaker global name/index entry: an 8-byte
+    pointer to the name string, then the uninitialized index slot.
+    """
+    sentinel = struct.unpack('<Q', SENTINEL)[0]
+    count = len(data_bytes) // 8
+    if count < 2:
+        return
+
+    if np is not None:
+        words = np.frombuffer(data_bytes, dtype='<u8', count=count)
+        hits = np.flatnonzero(words[1:] == sentinel)
+        yield from zip((hits * 8).tolist(), words[hits].tolist())
+        return
+
+    words = struct.iter_unpack('<Q', data_bytes[:count * 8])
+    prev = next(words)[0]
+    for i, (word,) in enumerate(words):
+        if word == sentinel:
+            yield i * 8, prev
+        prev = word
+
+
+def find_name_slots(data_bytes, string_vas):
+    """Sweep .data once for (pointer, SENTINEL) pairs.
+
+    string_vas maps pointer value -> key. Returns {key: offset of pointer}
+    for the first matching slot of each key.
+    """
+    found = {}
+    if not string_vas:
+        return found
+    for offset, pointer in iter_sentinel_slots(data_bytes):
+        key = string_vas.get(pointer)
+        if key is not None and key not in found:
+            found[key] = offset
+            if len(found) == len(string_vas):
                 break
-            search_pos = match + 1
+    return found
+
 
-        if not found:
-            print(f"  WARNING: No index address found for '{var_name}'")
+def dump_globals(pe):
+    """Recover every GameMaker global name -> index slot RVA in one .data pass.
 
+    Any (pointer into .rdata, SENTINEL) pair whose target is a
+    null-terminated identifier is taken as a global's name/index entry.
+    """
+    rdata = pe.get_section('.rdata')
+    data_sec = pe.get_section('.data')
+    if not rdata or not data_sec:
+        log.error("  ERROR: Missing .rdata or .data section")
+        return {}
+
+    rdata_bytes = pe.section_data(rdata)
+    data_bytes = pe.section_data(data_sec)
+    rdata_va = pe.image_base + rdata['virtual_address']
+    rdata_end = rdata_va + len(rdata_bytes)
+
+    results = {}
+    for offset, pointer in iter_sentinel_slots(data_bytes):
+        name = name_at(rdata_bytes, rdata_va, pointer)
+        if name is not None:
+            results.setdefault(name, data_sec['virtual_address'] + offset + 8)
+
+    return dict(sorted(results.items()))
+
+
+_IDENTIFIER_RE = re.compile(rb'([A-Za-z_][A-Za-z0-9_]*)\x00')
+
+
+def name_at(rdata_bytes, rdata_va, pointer):
+    """Return the identifier a .rdata pointer points at, or None."""
+    if not rdata_va <= pointer < rdata_va + len(rdata_bytes):
+        return None
+    start = pointer - rdata_va
+    m = _IDENTIFIER_RE.match(rdata_bytes[start:start + 256])
+    return m.group(1).decode('ascii') if m else None
+
+
+def write_globals_index(prefix, md5_hash, module_size, globals_map):
+    """Write a dump_globals result as <prefix>.json and <prefix>.bin."""
+    prefix = Path(prefix)
+    names = sorted(globals_map)
+
+    json_path = prefix.with_name(prefix.name + '.json')
+    json_path.write_text(json.dumps({
+        'md5': md5_hash, 'moduleSize': module_size,
+        'globals': {n: globals_map[n] for n in names},
+    }, indent=1) + '\n')
+
+    blob = bytearray()
+    records = bytearray()
+    for name in names:
+        records += GLOBALS_RECORD.pack(globals_map[name], len(blob))
+        blob += name.encode('ascii') + b'\x00'
+    header = GLOBALS_HEADER.pack(GLOBALS_MAGIC, GLOBALS_VERSION, 0,
+                                 bytes.fromhex(md5_hash), module_size,
+                                 len(names))
+    bin_path = prefix.with_name(prefix.name + '.bin')
+    bin_path.write_bytes(header + records + blob)
+    return json_path, bin_path
+
+
+def load_globals_index(path):
+    """Load a globals index (.json or .bin) as (md5, module_size, {name: rva})."""
+    path = Path(path)
+    raw = path.read_bytes()
+
+    if not raw.startswith(GLOBALS_MAGIC):
+        doc = json.loads(raw)
+        return doc['md5'], doc['moduleSize'], doc['globals']
+
+    magic, version, _, md5_raw, module_size, count = \
+        GLOBALS_HEADER.unpack_from(raw)
+    if version != GLOBALS_VERSION:
+        raise ValueError(f"Unsupported globals index version {version}")
+    blob_start = GLOBALS_HEADER.size + count * GLOBALS_RECORD.size
+    globals_map = {}
+    for rva, name_off in GLOBALS_RECORD.iter_unpack(
+            raw[GLOBALS_HEADER.size:blob_start]):
+        start = blob_start + name_off
+        end = raw.index(b'\x00', start)
+        globals_map[raw[start:end].decode('ascii')] = rva
+    return md5_raw.hex().upper(), module_size, globals_map
+
+
+def indices_from_globals(globals_map, variables=VARIABLES):
+    """Resolve VARIABLES against a loaded globals index instead of scanning."""
+    results = {}
+    for var_name, asl_name in variables:
+        if var_name in globals_map:
+            results[asl_name] = globals_map[var_name]
+            log.info(f"  {var_name:25s} -> 0x{globals_map[var_name]:x}")
+        else:
+            log.warning(f"  WARNING: '{var_name}' not in globals index")
     return results
 
 
-def find_global_data(pe, index_rvas, rip_refs):
+def find_global_data(pe, index_rvas, rip_refs, counts=None):
     """Find GlobalData RVA by scoring .data references near variable index xrefs.
 
+    rip_refs is the RefIndex returned by find_all_rip_refs. If counts is
+    a dict, the number of xrefs and candidates, and the variable votes
+    for the winner and runner-up, are stored in it.
+
     Code that uses a variable index also loads GlobalData nearby. We find
     instructions referencing variable index addresses, then look at nearby
     instructions for .data references. The address appearing near the most
@@ -297,6 +840,49 @@ def find_global_data(pe, index_rvas, rip_refs):
     if not data_sec or not index_rvas:
         return None
 
+    candidates = defaultdict(set)  # target_rva -> set of variable names
+    num_xrefs = score_global_data(pe, index_rvas, rip_refs, candidates)
+    if counts is not None:
+        counts.update(xrefs=num_xrefs, candidates=len(candidates))
+    if not num_xrefs:
+        log.warning("  WARNING: No code references to variable indices found")
+        return None
+    log.info(f"  Found {num_xrefs} code references to variable indices")
+
+    if not candidates:
+        log.warning("  WARNING: No GlobalData candidates found")
+        return None
+
+    ranked = rank_candidates(candidates)
+    best_rva, best_vars = ranked[0]
+    if counts is not None:
+        counts.update(votes=len(best_vars),
+                      runnerUpVotes=len(ranked[1][1]) if len(ranked) > 1 else 0)
+
+    log.info(f"  GlobalData -> 0x{best_rva:x} "
+             f"(near {len(best_vars)}/{len(index_rvas)} variables)")
+    if len(ranked) > 1:
+        r2_rva, r2_vars = ranked[1]
+        log.info(f"  Runner-up:    0x{r2_rva:x} (near {len(r2_vars)} variables)")
+
+    # Extra info: check if it's in BSS region (beyond raw data)
+    bss_start = data_sec['virtual_address'] + data_sec['raw_size']
+    if best_rva >= bss_start:
+        log.info(f"  (In BSS region - expected for runtime-initialized pointer)")
+
+    return best_rva
+
+
+def score_global_data(pe, index_rvas, rip_refs, candidates, xref_range=None):
+    """Add GlobalData votes from rip_refs into candidates; return xref count.
+
+    candidates maps a .data target RVA to the set of variable names whose
+    code references it appears near. With xref_range=(lo, hi), only
+    xrefs at lo <= inst_rva < hi are counted, so overlapping partial
+    indexes can be scored without double counting.
+    """
+    data_sec = pe.get_section('.data')
+
     # Map target RVAs to variable names (both index addr and struct base)
     index_targets = {}
     for name, rva in index_rvas.items():
@@ -305,51 +891,29 @@ def find_global_data(pe, index_rvas, rip_refs):
 
     # Find code xrefs to variable index addresses
     xrefs = []  # (inst_rva, var_name)
-    for inst_rva, target in rip_refs:
-        if target in index_targets:
-            xrefs.append((inst_rva, index_targets[target]))
-
-    if not xrefs:
-        print("  WARNING: No code references to variable indices found")
-        return None
-    print(f"  Found {len(xrefs)} code references to variable indices")
-
-    # Sort all refs for efficient range queries
-    sorted_refs = sorted(rip_refs, key=lambda x: x[0])
-    sorted_rvas = [r[0] for r in sorted_refs]
+    for target, var_name in index_targets.items():
+        for inst_rva in rip_refs.refs_to(target):
+            if xref_range and not xref_range[0] <= inst_rva < xref_range[1]:
+                continue
+            xrefs.append((inst_rva, var_name))
+    xrefs.sort()
 
     # Score candidates: for each xref, find nearby .data references
-    candidates = defaultdict(set)  # target_rva -> set of variable names
-
+    targets = rip_refs.targets
     for xref_rva, var_name in xrefs:
-        left = bisect.bisect_left(sorted_rvas, xref_rva - 64)
-        right = bisect.bisect_right(sorted_rvas, xref_rva + 64)
-        for i in range(left, right):
-            _, nearby_target = sorted_refs[i]
+        left, right = rip_refs.window(xref_rva - 64, xref_rva + 64)
+        for nearby_target in targets[left:right]:
             if nearby_target in index_targets:
                 continue
             if pe.rva_in_section(nearby_target, data_sec):
                 candidates[nearby_target].add(var_name)
 
-    if not candidates:
-        print("  WARNING: No GlobalData candidates found")
-        return None
+    return len(xrefs)
 
-    ranked = sorted(candidates.items(), key=lambda x: len(x[1]), reverse=True)
-    best_rva, best_vars = ranked[0]
 
-    print(f"  GlobalData -> 0x{best_rva:x} "
-          f"(near {len(best_vars)}/{len(index_rvas)} variables)")
-    if len(ranked) > 1:
-        r2_rva, r2_vars = ranked[1]
-        print(f"  Runner-up:    0x{r2_rva:x} (near {len(r2_vars)} variables)")
-
-    # Extra info: check if it's in BSS region (beyond raw data)
-    bss_start = data_sec['virtual_address'] + data_sec['raw_size']
-    if best_rva >= bss_start:
-        print(f"  (In BSS region - expected for runtime-initialized pointer)")
-
-    return best_rva
+def rank_candidates(candidates):
+    """GlobalData candidates as (rva, variables), most variables first."""
+    return sorted(candidates.items(), key=lambda x: len(x[1]), reverse=True)
 
 
 def compute_room(global_data_rva, pe):
@@ -358,14 +922,169 @@ def compute_room(global_data_rva, pe):
     data_sec = pe.get_section('.data')
 
     if data_sec and pe.rva_in_section(room_rva, data_sec):
-        print(f"  room -> 0x{room_rva:x} (GlobalData + 0x{ROOM_OFFSET:X})")
+        log.info(f"  room -> 0x{room_rva:x} (GlobalData + 0x{ROOM_OFFSET:X})")
     else:
-        print(f"  WARNING: room 0x{room_rva:x} outside .data section!")
-        print(f"  The fixed offset 0x{ROOM_OFFSET:X} may have changed.")
+        log.warning(f"  WARNING: room 0x{room_rva:x} outside .data section!")
+        log.warning(f"  The fixed offset 0x{ROOM_OFFSET:X} may have changed.")
 
     return room_rva
 
 
+def nearest_known_version(pe):
+    """MD5 of the KNOWN_VERSIONS build whose moduleSize is closest to pe's.
+
+    Ties go to the build that records the most addresses. KNOWN_VERSIONS
+    holds no section layout, so SizeOfImage is the only layout signal.
+    """
+    return min(KNOWN_VERSIONS, key=lambda h: (
+        abs(KNOWN_VERSIONS[h]['moduleSize'] - pe.size_of_image),
+        -len(known_addresses(h))))
+
+
+def find_indices_near(pe, seed, variables=VARIABLES):
+    """Look for variable index slots in a .data window around seed RVAs.
+
+    Every (pointer, SENTINEL) slot within DELTA_WINDOW of the seed's
+    index RVAs is checked by reading the name it points at, so a hit is
+    verified without scanning .rdata. Returns {asl_name: index_rva}.
+    """
+    rdata = pe.get_section('.rdata')
+    data_sec = pe.get_section('.data')
+    seed_rvas = [seed[an] for _, an in variables if an in seed]
+    if not rdata or not data_sec or not seed_rvas:
+        return {}
+
+    rdata_bytes = pe.section_data(rdata)
+    data_bytes = pe.section_data(data_sec)
+    rdata_va = pe.image_base + rdata['virtual_address']
+    base = data_sec['virtual_address']
+    lo = max(min(seed_rvas) - DELTA_WINDOW - base, 0) & ~7
+    hi = max(min(max(seed_rvas) + DELTA_WINDOW - base, len(data_bytes)), lo)
+
+    wanted = dict(variables)
+    found = {}
+    for offset, pointer in iter_sentinel_slots(data_bytes[lo:hi]):
+        asl_name = wanted.get(name_at(rdata_bytes, rdata_va, pointer))
+        if asl_name and asl_name not in found:
+            found[asl_name] = base + lo + offset + 8
+    return found
+
+
+def find_global_data_near(pe, index_rvas, seed_global_data, use_numpy=None):
+    """Score GlobalData candidates while scanning .text one chunk at a time.
+
+    Stops as soon as the leading candidate lies within DELTA_WINDOW of
+    the seed's GlobalData, is near at least DELTA_MIN_VOTES variables and
+    beats the runner-up. If that never happens the whole section ends up
+    scanned, which gives the same ranking as find_global_data.
+    Returns (rva or None, variables near it, bytes of .text scanned).
+    """
+    text_sec = pe.get_section('.text')
+    if not text_sec or not index_rvas:
+        return None, 0, 0
+
+    text_data = pe.section_data(text_sec)
+    text_rva = text_sec['virtual_address']
+    length = len(text_data)
+    need = min(DELTA_MIN_VOTES, len(index_rvas))
+    candidates = defaultdict(set)
+
+    for start in range(0, length, DELTA_TEXT_CHUNK):
+        end = min(start + DELTA_TEXT_CHUNK, length)
+        # 64 bytes of context each side for the nearby-reference window,
+        # plus the REX byte before and the instruction tail after.
+        lo = max(start - 65, 0)
+        hi = min(end + 64 + CHUNK_OVERLAP, length)
+        refs = find_all_rip_refs(text_data[lo:hi], text_rva + lo, use_numpy)
+        score_global_data(pe, index_rvas, refs, candidates,
+                          xref_range=(text_rva + start, text_rva + end))
+
+        ranked = rank_candidates(candidates)
+        if ranked and seed_global_data is not None:
+            best_rva, best_vars = ranked[0]
+            runner_up = len(ranked[1][1]) if len(ranked) > 1 else 0
+            if (abs(best_rva - seed_global_data) <= DELTA_WINDOW
+                    and len(best_vars) >= need
+                    and len(best_vars) > runner_up):
+                return best_rva, len(best_vars), end
+
+    ranked = rank_candidates(candidates)
+    if not ranked:
+        return None, 0, length
+    return ranked[0][0], len(ranked[0][1]), length
+
+
+def run_delta_extraction(pe, use_numpy=None, metrics=None):
+    """Extract addresses by searching near the closest known build first.
+
+    Index slots are looked up in a .data window around the seed's index
+    RVAs, and GlobalData by an early-exit .text scan. Anything not
+    verified locally falls back to the full-section search. Prints a
+    report of how far each address moved from the seed.
+    """
+    metrics = metrics or StageMetrics()
+    seed_md5 = nearest_known_version(pe)
+    seed = KNOWN_VERSIONS[seed_md5]
+    log.info(f"Seeding from {seed['name']} (moduleSize {seed['moduleSize']},"
+             f" {pe.size_of_image - seed['moduleSize']:+d} bytes)")
+    log.info("")
+
+    log.info("Finding variable indices near seed...")
+    with metrics.stage('variable_indices') as counts:
+        indices = find_indices_near(pe, seed)
+        via = {an: 'window' for an in indices}
+        missing = [(vn, an) for vn, an in VARIABLES if an not in indices]
+        if missing:
+            log.info(f"  {len(missing)} not found locally, widening to full scan")
+            widened = find_variable_indices(pe, variables=missing)
+            indices.update(widened)
+            via.update((an, 'full scan') for an in widened)
+        counts.update(indices=len(indices), widened=len(missing))
+    log.info(f"  Found {len(indices)}/{len(VARIABLES)} variable indices")
+    log.info("")
+
+    log.info("Finding GlobalData near seed...")
+    with metrics.stage('global_data') as counts:
+        global_data, votes, scanned = find_global_data_near(
+            pe, indices, seed.get('globalData'), use_numpy=use_numpy)
+        counts.update(votes=votes, scannedBytes=scanned)
+    text_sec = pe.get_section('.text')
+    text_size = text_sec['raw_size'] if text_sec else 0
+    if global_data is not None:
+        log.info(f"  GlobalData -> 0x{global_data:x} (near {votes}/{len(indices)}"
+                 f" variables, scanned {scanned:,}/{text_size:,} bytes of .text)")
+        via['globalData'] = ('early exit' if scanned < text_size
+                             else 'full scan')
+    else:
+        log.warning("  WARNING: No GlobalData candidates found")
+    log.info("")
+
+    log.info("Computing room address...")
+    room = compute_room(global_data, pe) if global_data else None
+    if room:
+        via['room'] = 'GlobalData + offset'
+    log.info("")
+
+    addresses = dict(indices)
+    if global_data:
+        addresses['globalData'] = global_data
+    if room:
+        addresses['room'] = room
+
+    log.info(f"--- Delta report (seed: {seed['name']}) ---")
+    log.info(f"  {'address':22s} {'seed':>11s} {'found':>11s} {'moved':>10s}  via")
+    for key in ADDRESS_KEYS:
+        old, new = seed.get(key), addresses.get(key)
+        old_s = f"0x{old:x}" if old is not None else '-'
+        new_s = f"0x{new:x}" if new is not None else 'NOT FOUND'
+        moved = f"{new - old:+#x}" if old is not None and new is not None else ''
+        log.info(f"  {key:22s} {old_s:>11s} {new_s:>11s} {moved:>10s}"
+                 f"  {via.get(key, '')}")
+    log.info("")
+
+    return addresses
+
+
 def format_asl_state(version_name, addresses):
     """Generate a ready-to-paste ASL state() block."""
     lines = [f'state("Windswept", "{version_name}") {{']
@@ -407,6 +1126,232 @@ def format_asl_init(version_name, md5_hash, module_size, akc_supported):
     return '\n'.join(lines)
 
 
+class StageMetrics:
+    """Per-stage wall time, CPU time, peak memory and item counts.
+
+    Wrap each pipeline stage in `with metrics.stage(name) as counts:` and
+    put item counts (refs, xrefs, ...) into the yielded dict. With
+    trace_memory, tracemalloc's peak is recorded per stage; peak RSS is
+    recorded where the platform reports it. If profile_stage names a
+    stage, that stage runs under cProfile and its stats are dumped to
+    profile_path (default <stage>.prof).
+    """
+
+    def __init__(self, trace_memory=False, profile_stage=None,
+                 profile_path=None):
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        counts = {}
+        profiler = None
+        if name == self.profile_stage:
+            profiler = cProfile.Profile()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield counts
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(self.profile_path or f"{name}.prof")
+            record = {'stage': name,
+                      'wall': round(time.perf_counter() - wall, 6),
+                      'cpu': round(time.process_time() - cpu, 6)}
+            if self.trace_memory:
+                record['peakTraced'] = tracemalloc.get_traced_memory()[1]
+            rss = peak_rss()
+            if rss is not None:
+                record['peakRss'] = rss
+            record.update(counts)
+            self.stages.append(record)
+
+    def as_list(self):
+        return list(self.stages)
+
+    def print_summary(self, out=sys.stdout):
+        print("--- Stage metrics ---", file=out)
+        print(f"  {'stage':18s} {'wall s':>9s} {'cpu s':>9s} {'traced MB':>10s}"
+              f" {'rss MB':>8s}  counts", file=out)
+        for r in self.stages:
+            traced = (f"{r['peakTraced'] / (1 << 20):10.1f}"
+                      if 'peakTraced' in r else f"{'-':>10s}")
+            rss = (f"{r['peakRss'] / (1 << 20):8.1f}"
+                   if 'peakRss' in r else f"{'-':>8s}")
+            counts = ', '.join(f"{k}={v:,}" for k, v in r.items()
+                               if k not in _METRIC_FIELDS)
+            print(f"  {r['stage']:18s} {r['wall']:9.3f} {r['cpu']:9.3f}"
+                  f" {traced} {rss}  {counts}", file=out)
+        print(file=out)
+
+
+_METRIC_FIELDS = frozenset(('stage', 'wall', 'cpu', 'peakTraced', 'peakRss'))
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def aggregate_metrics(runs):
+    """Combine StageMetrics.as_list() results from many runs, per stage.
+
+    Returns {stage: {'runs', 'wall', 'cpu', 'maxWall', 'maxPeakRss',
+    'maxPeakTraced', <count>: total}}.
+    """
+    totals = {}
+    for run in runs:
+        for r in run:
+            t = totals.setdefault(r['stage'], {'runs': 0, 'wall': 0.0,
+                                               'cpu': 0.0, 'maxWall': 0.0})
+            t['runs'] += 1
+            t['wall'] += r['wall']
+            t['cpu'] += r['cpu']
+            t['maxWall'] = max(t['maxWall'], r['wall'])
+            for key, out in (('peakRss', 'maxPeakRss'),
+                             ('peakTraced', 'maxPeakTraced')):
+                if key in r:
+                    t[out] = max(t.get(out, 0), r[key])
+            for key, value in r.items():
+                if key not in _METRIC_FIELDS:
+                    t[key] = t.get(key, 0) + value
+    for t in totals.values():
+        t['wall'] = round(t['wall'], 6)
+        t['cpu'] = round(t['cpu'], 6)
+    return totals
+
+
+class ExtractionCache:
+    """On-disk cache of extraction results, keyed by exe fingerprint.
+
+    Each build gets a directory named <file size>-<PE timestamp>-<MD5>
+    holding result.json (addresses and SizeOfImage) and, optionally,
+    refs.bin (a serialized RefIndex). Directory mtimes record last use;
+    the least recently used entries are evicted once the cache exceeds
+    max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR,
+                 max_bytes=DEFAULT_CACHE_MB << 20):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _entry(self, pe):
+        key = f"{pe.file_size():x}-{pe.timestamp:08x}-{pe.md5()}"
+        return self.directory / key
+
+    def _read(self, pe, name):
+        path = self._entry(pe) / name
+        try:
+            raw = path.read_bytes()
+        except OSError:
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(path.parent)
+        return raw
+
+    def _write(self, pe, name, raw):
+        entry = self._entry(pe)
+        entry.mkdir(parents=True, exist_ok=True)
+        tmp = entry / f"{name}.{os.getpid()}.tmp"
+        tmp.write_bytes(raw)
+        os.replace(tmp, entry / name)
+        os.utime(entry)
+        self.evict(keep=entry)
+
+    def get_result(self, pe):
+        """Return cached {'moduleSize', 'addresses', ['confidence']} or None."""
+        raw = self._read(pe, 'result.json')
+        if raw is None:
+            return None
+        try:
+            doc = json.loads(raw)
+        except ValueError:
+            return None
+        if doc.get('heuristics') != HEURISTICS_VERSION:
+            return None
+        return doc
+
+    def put_result(self, pe, addresses, confidence=None):
+        doc = {'heuristics': HEURISTICS_VERSION,
+               'moduleSize': pe.size_of_image, 'addresses': addresses}
+        if confidence is not None:
+            doc['confidence'] = confidence
+        self._write(pe, 'result.json', json.dumps(doc).encode())
+
+    def get_refs(self, pe):
+        """Return the cached RefIndex or None."""
+        raw = self._read(pe, 'refs.bin')
+        if raw is None:
+            return None
+        try:
+            return RefIndex.from_bytes(raw)
+        except (ValueError, struct.error):
+            return None
+
+    def put_refs(self, pe, rip_refs):
+        self._write(pe, 'refs.bin', rip_refs.to_bytes())
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until under max_bytes."""
+        entries = []
+        total = 0
+        for entry in self.directory.iterdir():
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except OSError:
+                continue  # Removed by a concurrent process
+            total += size
+
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            with contextlib.suppress(OSError):
+                for f in entry.iterdir():
+                    f.unlink()
+                entry.rmdir()
+            total -= size
+
+
+def compare_known(md5_hash, addresses):
+    """Compare extracted addresses against known version data.
+
+    Returns a list of (key, expected, actual, status) where status is one
+    of 'OK', 'DIFF' or 'MISS'. Keys the known version lacks are skipped.
+    """
+    known = KNOWN_VERSIONS[md5_hash]
+    results = []
+    for key in ADDRESS_KEYS:
+        if key not in known:
+            continue
+        expected = known[key]
+        actual = addresses.get(key)
+        if actual is None:
+            status = 'MISS'
+        elif actual == expected:
+            status = 'OK'
+        else:
+            status = 'DIFF'
+        results.append((key, expected, actual, status))
+    return results
+
+
 def validate(md5_hash, addresses):
     """Compare extracted addresses against known version data."""
     known = KNOWN_VERSIONS[md5_hash]
@@ -414,22 +1359,14 @@ def validate(md5_hash, addresses):
     print(f"  Expected ModuleMemorySize: {known['moduleSize']}")
 
     all_ok = True
-    checks = [('room', 'room'), ('globalData', 'globalData')]
-    checks += [(an, an) for _, an in VARIABLES]
-
-    for addr_key, known_key in checks:
-        if known_key not in known:
-            continue
-        expected = known[known_key]
-        actual = addresses.get(addr_key)
-
-        if actual is None:
-            print(f"  MISS  {addr_key}: expected 0x{expected:x}, not found")
+    for key, expected, actual, status in compare_known(md5_hash, addresses):
+        if status == 'MISS':
+            print(f"  MISS  {key}: expected 0x{expected:x}, not found")
             all_ok = False
-        elif actual == expected:
-            print(f"  OK    {addr_key}: 0x{actual:x}")
+        elif status == 'OK':
+            print(f"  OK    {key}: 0x{actual:x}")
         else:
-            print(f"  DIFF  {addr_key}: got 0x{actual:x},"
+            print(f"  DIFF  {key}: got 0x{actual:x},"
                   f" expected 0x{expected:x}")
             all_ok = False
 
@@ -441,54 +1378,58 @@ def validate(md5_hash, addresses):
     return all_ok
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Extract Windswept autosplitter addresses from an exe")
-    parser.add_argument('exe', help='Path to Windswept.exe')
-    parser.add_argument('--version-name',
-                        help='Version name for ASL output (auto-detected'
-                             ' for known versions)')
-    args = parser.parse_args()
-
-    path = Path(args.exe)
-    if not path.exists():
-        print(f"ERROR: {path} not found")
-        sys.exit(1)
-
-    print(f"Loading {path.name}...")
-    pe = PEFile(path)
+def run_extraction(pe, use_numpy=None, globals_map=None, scan_jobs=1,
+                   cache=None, cache_refs=False, metrics=None):
+    """Run the full pipeline on a loaded PEFile and return the addresses.
 
-    md5 = pe.md5()
-    file_size = pe.file_size()
-    print(f"  MD5:         {md5}")
-    print(f"  File size:   {file_size}")
-    print(f"  SizeOfImage: {pe.size_of_image} (ModuleMemorySize)")
-    print()
+    If globals_map (from load_globals_index) is given, variable indices
+    are read from it instead of scanning .rdata/.data. scan_jobs > 1
+    splits the .text scan across that many processes (None = per CPU).
+    With an ExtractionCache, a cached RefIndex replaces the .text scan,
+    and cache_refs stores a freshly scanned one. Stages are recorded in
+    metrics (a StageMetrics) if given.
+    """
+    metrics = metrics or StageMetrics()
 
     # Step 1: Find variable indices
-    print("Finding variable indices...")
-    indices = find_variable_indices(pe)
-    print(f"  Found {len(indices)}/{len(VARIABLES)} variable indices")
-    print()
+    log.info("Finding variable indices...")
+    with metrics.stage('variable_indices') as counts:
+        if globals_map is not None:
+            indices = indices_from_globals(globals_map)
+        else:
+            indices = find_variable_indices(pe)
+        counts['indices'] = len(indices)
+    log.info(f"  Found {len(indices)}/{len(VARIABLES)} variable indices")
+    log.info("")
 
     # Step 2: Find GlobalData
-    print("Finding GlobalData...")
+    log.info("Finding GlobalData...")
     text_sec = pe.get_section('.text')
     global_data = None
     if text_sec:
-        text_data = pe.section_data(text_sec)
-        print(f"  Scanning .text ({len(text_data):,} bytes)...")
-        rip_refs = find_all_rip_refs(text_data, text_sec['virtual_address'])
-        print(f"  Found {len(rip_refs):,} RIP-relative references")
-        global_data = find_global_data(pe, indices, rip_refs)
+        with metrics.stage('text_scan') as counts:
+            rip_refs = cache.get_refs(pe) if cache else None
+            if rip_refs is not None:
+                log.info("  Using cached .text references")
+                counts['cached'] = 1
+            else:
+                log.info(f"  Scanning .text ({text_sec['raw_size']:,} bytes)...")
+                rip_refs = find_all_rip_refs_parallel(
+                    pe, text_sec, jobs=scan_jobs, use_numpy=use_numpy)
+                if cache and cache_refs:
+                    cache.put_refs(pe, rip_refs)
+            counts['refs'] = len(rip_refs)
+        log.info(f"  Found {len(rip_refs):,} RIP-relative references")
+        with metrics.stage('global_data') as counts:
+            global_data = find_global_data(pe, indices, rip_refs, counts)
     else:
-        print("  ERROR: No .text section found")
-    print()
+        log.error("  ERROR: No .text section found")
+    log.info("")
 
     # Step 3: Compute room address
-    print("Computing room address...")
+    log.info("Computing room address...")
     room = compute_room(global_data, pe) if global_data else None
-    print()
+    log.info("")
 
     # Collect results
     addresses = dict(indices)
@@ -496,33 +1437,309 @@ def main():
         addresses['globalData'] = global_data
     if room:
         addresses['room'] = room
+    return addresses
 
-    # Determine version name and AKC support
-    version_name = args.version_name
-    if not version_name and md5 in KNOWN_VERSIONS:
-        version_name = KNOWN_VERSIONS[md5]['name']
-    if not version_name:
-        version_name = "Unknown"
 
+@dataclass(slots=True)
+class ExtractionResult:
+    """What extract() found for one build.
+
+    addresses maps ADDRESS_KEYS to RVAs and confidence maps the same keys
+    to scores in [0, 1]. source says how they were obtained: 'known'
+    (a KNOWN_VERSIONS build), 'cache', 'delta' or 'scan'. diagnostics
+    holds the warnings logged while extracting, and timings the
+    StageMetrics records of each stage that ran.
+    """
+    md5: str
+    file_size: int
+    module_size: int
+    version: str | None = None
+    source: str = 'scan'
+    addresses: dict = field(default_factory=dict)
+    confidence: dict = field(default_factory=dict)
+    diagnostics: list = field(default_factory=list)
+    timings: list = field(default_factory=list)
+
+    def as_dict(self):
+        """JSON-able form, with addresses in ADDRESS_KEYS order."""
+        return {
+            'md5': self.md5, 'fileSize': self.file_size,
+            'moduleSize': self.module_size, 'version': self.version,
+            'source': self.source,
+            'addresses': {k: self.addresses[k] for k in ADDRESS_KEYS
+                          if k in self.addresses},
+            'confidence': self.confidence, 'diagnostics': self.diagnostics,
+            'timings': self.timings,
+        }
+
+
+class _DiagnosticsHandler(logging.Handler):
+    """Collects the warnings and errors logged by the current thread."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            message = record.getMessage().strip()
+            for prefix in ('WARNING: ', 'ERROR: '):
+                message = message.removeprefix(prefix)
+            self.messages.append(message)
+
+
+def score_confidence(pe, addresses, metrics):
+    """Confidence in [0, 1] for each address found by a pipeline run.
+
+    Indices come from an exact name/sentinel match and score 1.0.
+    GlobalData scores the share of variables whose code loads it nearby,
+    halved when the runner-up drew as many votes. room inherits
+    GlobalData's score, halved if it falls outside .data.
+    """
+    counts = {r['stage']: r for r in metrics.as_list()}
+    indices = [an for _, an in VARIABLES if an in addresses]
+    confidence = {an: 1.0 for an in indices}
+
+    global_data = addresses.get('globalData')
+    if global_data is not None:
+        votes = counts.get('global_data', {})
+        score = votes.get('votes', 0) / len(indices) if indices else 0.0
+        if votes.get('runnerUpVotes', 0) >= votes.get('votes', 0):
+            score /= 2
+        confidence['globalData'] = round(min(score, 1.0), 3)
+
+    room = addresses.get('room')
+    if room is not None and global_data is not None:
+        data_sec = pe.get_section('.data')
+        in_data = data_sec is not None and pe.rva_in_section(room, data_sec)
+        confidence['room'] = (confidence['globalData'] if in_data
+                              else round(confidence['globalData'] / 2, 3))
+    return confidence
+
+
+def _known_result(md5_hash, file_size, metrics):
+    known = KNOWN_VERSIONS[md5_hash]
+    addresses = known_addresses(md5_hash)
+    return ExtractionResult(
+        md5_hash, file_size, known['moduleSize'], version=known['name'],
+        source='known', addresses=addresses,
+        confidence={k: 1.0 for k in addresses}, timings=metrics.as_list())
+
+
+def extract_pe(pe, use_numpy=None, globals_map=None, jobs=1, cache=None,
+               cache_refs=False, delta=False, metrics=None):
+    """Run the pipeline on a loaded PEFile and return an ExtractionResult.
+
+    A cached result is used when cache (an ExtractionCache) has one.
+    Otherwise addresses come from run_delta_extraction if delta is set,
+    or run_extraction; see that for globals_map, jobs and cache_refs.
+    Stages are recorded in metrics (a StageMetrics) if given.
+    """
+    metrics = metrics or StageMetrics()
+    handler = _DiagnosticsHandler()
+    log.addHandler(handler)
+    try:
+        md5 = pe.md5()
+        cached = (cache.get_result(pe) if cache and globals_map is None
+                  else None)
+        if cached:
+            log.info("Using cached addresses (--no-cache to re-extract)")
+            log.info("")
+            source = 'cache'
+            addresses = cached['addresses']
+            confidence = cached.get('confidence', {})
+        elif delta and globals_map is None:
+            source = 'delta'
+            addresses = run_delta_extraction(pe, use_numpy=use_numpy,
+                                             metrics=metrics)
+            confidence = score_confidence(pe, addresses, metrics)
+        else:
+            source = 'scan'
+            addresses = run_extraction(pe, use_numpy=use_numpy,
+                                       globals_map=globals_map,
+                                       scan_jobs=jobs, cache=cache,
+                                       cache_refs=cache_refs, metrics=metrics)
+            confidence = score_confidence(pe, addresses, metrics)
+            if cache and globals_map is None:
+                cache.put_result(pe, addresses, confidence)
+    finally:
+        log.removeHandler(handler)
+
+    return ExtractionResult(
+        md5, pe.file_size(), pe.size_of_image,
+        version=KNOWN_VERSIONS.get(md5, {}).get('name'), source=source,
+        addresses=addresses, confidence=confidence,
+        diagnostics=handler.messages, timings=metrics.as_list())
+
+
+def extract(source, use_numpy=None, use_mmap=True, identify=True,
+            delta=False, jobs=1, cache_dir=None, cache_refs=False,
+            metrics=None):
+    """Extract the autosplitter addresses of one build.
+
+    source is a path or an in-memory buffer holding the exe. Nothing is
+    printed; progress is logged to the 'extract_addresses' logger, and
+    warnings are also returned as the result's diagnostics. With
+    identify, KNOWN_VERSIONS builds are answered without scanning. Raises
+    OSError or ValueError if source can't be read as a PE32+ file.
+    """
+    metrics = metrics or StageMetrics()
+    is_buffer = isinstance(source, (bytes, bytearray, memoryview, mmap.mmap))
+    header = None
+    if identify and not is_buffer:
+        with metrics.stage('identify'):
+            md5, header = identify_known_version(source)
+        if md5:
+            return _known_result(md5, header.file_size(), metrics)
+
+    with metrics.stage('load'):
+        pe = PEFile(source, use_mmap=use_mmap)
+    with pe:
+        if header is not None and header._md5 is not None:
+            pe._md5 = header._md5  # Already streamed while identifying
+        with metrics.stage('md5'):
+            md5 = pe.md5()
+        if identify and is_buffer and md5 in KNOWN_VERSIONS:
+            return _known_result(md5, pe.file_size(), metrics)
+        cache = ExtractionCache(cache_dir) if cache_dir else None
+        return extract_pe(pe, use_numpy=use_numpy, jobs=jobs, cache=cache,
+                          cache_refs=cache_refs, delta=delta,
+                          metrics=metrics)
+
+
+def extract_file(path, use_numpy=None, use_mmap=True, cache_dir=None,
+                 cache_refs=False, metrics=None):
+    """Batch worker: run the pipeline on one exe and return a JSON-able dict.
+
+    Known builds are extracted too, so they can be validated. Failures
+    are reported in the result's 'error' field rather than raised. If
+    metrics is a dict of StageMetrics arguments, per-stage metrics are
+    included.
+    """
+    start = time.perf_counter()
+    result = {'path': str(path)}
+    try:
+        found = extract(path, use_numpy=use_numpy, use_mmap=use_mmap,
+                        identify=False, cache_dir=cache_dir,
+                        cache_refs=cache_refs,
+                        metrics=StageMetrics(**(metrics or {})))
+    except (OSError, ValueError, struct.error) as e:
+        result['error'] = str(e)
+        return result
+
+    doc = found.as_dict()
+    timings = doc.pop('timings')
+    result.update(doc)
+    if found.md5 in KNOWN_VERSIONS:
+        result['validation'] = {
+            key: status
+            for key, _, _, status in compare_known(found.md5, found.addresses)}
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    if metrics is not None:
+        result['metrics'] = timings
+    return result
+
+
+def collect_exes(paths):
+    """Expand directories to the .exe files beneath them."""
+    exes = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            exes.extend(sorted(q for q in p.rglob('*')
+                               if q.suffix.lower() == '.exe' and q.is_file()))
+        else:
+            exes.append(p)
+    return exes
+
+
+def print_validation_matrix(results, out=sys.stderr):
+    """Print a key x build matrix of validation statuses."""
+    print("--- Validation matrix ---", file=out)
+    print("  OK/DIFF/MISS vs KNOWN_VERSIONS; ? = found in unknown build;"
+          " - = not extracted or not known", file=out)
+    for i, r in enumerate(results, 1):
+        label = r.get('version') or 'unknown build'
+        if 'error' in r:
+            label = f"ERROR: {r['error']}"
+        print(f"  [{i}] {label} ({r['path']})", file=out)
+    print(file=out)
+
+    header = ''.join(f"{f'[{i}]':>6s}" for i in range(1, len(results) + 1))
+    print(f"  {'':22s}{header}", file=out)
+    for key in ADDRESS_KEYS:
+        cells = []
+        for r in results:
+            if 'error' in r:
+                cells.append('ERR')
+            elif 'validation' not in r:
+                cells.append('?' if key in r['addresses'] else '-')
+            else:
+                cells.append(r['validation'].get(key, '-'))
+        print(f"  {key:22s}" + ''.join(f"{c:>6s}" for c in cells), file=out)
+
+    validated = [r for r in results if 'validation' in r]
+    bad = [r for r in validated if set(r['validation'].values()) != {'OK'}]
+    print(file=out)
+    print(f"  {len(validated) - len(bad)}/{len(validated)} known builds fully"
+          f" match; {len(results) - len(validated)} unknown or failed",
+          file=out)
+
+
+def batch_main(paths, jobs=None, use_numpy=None, use_mmap=True,
+               cache_dir=None, cache_refs=False, metrics=None,
+               metrics_json=None):
+    """Extract many builds in parallel, streaming JSON lines to stdout.
+
+    With metrics (StageMetrics arguments), per-build stage metrics are
+    included in each line and their aggregate is written to metrics_json.
+    """
+    exes = collect_exes(paths)
+    if not exes:
+        print("ERROR: no executables found", file=sys.stderr)
+        sys.exit(1)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(extract_file, exe, use_numpy, use_mmap,
+                               cache_dir, cache_refs, metrics): exe
+                   for exe in exes}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            print(json.dumps(result), flush=True)
+
+    ordered = [results[exe] for exe in exes]
+    print_validation_matrix(ordered)
+    if metrics_json:
+        runs = [r['metrics'] for r in ordered if 'metrics' in r]
+        Path(metrics_json).write_text(json.dumps(
+            {'builds': {r['path']: r.get('metrics') for r in ordered},
+             'aggregate': aggregate_metrics(runs)}, indent=1) + '\n')
+
+
+def known_addresses(md5_hash):
+    """The stored addresses of a KNOWN_VERSIONS build."""
+    known = KNOWN_VERSIONS[md5_hash]
+    return {k: known[k] for k in ADDRESS_KEYS if k in known}
+
+
+def print_report(version_name, md5_hash, file_size, module_size, addresses):
+    """Print the address summary and ready-to-paste ASL blocks."""
     akc_supported = all(
         an in addresses for _, an in VARIABLES[5:])  # collectable arrays
 
-    # Print results
     print("=" * 60)
     print(f"Version: {version_name}")
-    print(f"MD5:     {md5}")
+    print(f"MD5:     {md5_hash}")
     print(f"Size:    {file_size}")
-    print(f"Module:  {pe.size_of_image} (ModuleMemorySize)")
+    print(f"Module:  {module_size} (ModuleMemorySize)")
     print()
 
     print("Addresses:")
-    if room:
-        print(f"  {'room':30s} 0x{room:x}")
-    if global_data:
-        print(f"  {'globalData':30s} 0x{global_data:x}")
-    for var_name, asl_name in VARIABLES:
-        if asl_name in indices:
-            print(f"  {asl_name:30s} 0x{indices[asl_name]:x}")
+    for key in ADDRESS_KEYS:
+        if key in addresses:
+            print(f"  {key:30s} 0x{addresses[key]:x}")
     print()
 
     print("--- ASL state() block ---")
@@ -530,14 +1747,170 @@ def main():
     print()
 
     print("--- ASL init() block ---")
-    print(format_asl_init(version_name, md5, pe.size_of_image, akc_supported))
+    print(format_asl_init(version_name, md5_hash, module_size, akc_supported))
     print()
 
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract Windswept autosplitter addresses from an exe")
+    parser.add_argument('exe', nargs='+',
+                        help='Path to Windswept.exe; several paths or a'
+                             ' directory run in batch mode')
+    parser.add_argument('--version-name',
+                        help='Version name for ASL output (auto-detected'
+                             ' for known versions)')
+    parser.add_argument('--no-numpy', action='store_true',
+                        help='Use the pure-Python .text scanner even if'
+                             ' NumPy is installed')
+    parser.add_argument('--no-mmap', action='store_true',
+                        help='Read the whole exe into memory instead of'
+                             ' memory-mapping it')
+    parser.add_argument('--dump-globals', metavar='PREFIX',
+                        help='Dump every global name -> index slot to'
+                             ' PREFIX.json and PREFIX.bin, then exit')
+    parser.add_argument('--globals-index', metavar='PATH',
+                        help='Read variable indices from a --dump-globals'
+                             ' index instead of scanning .rdata/.data')
+    parser.add_argument('--jobs', type=int,
+                        help='Worker processes for batch mode, or for the'
+                             ' .text scan of a single exe (default: one'
+                             ' per CPU)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f'Extraction cache directory'
+                             f' (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_CACHE_MB,
+                        help='Evict least recently used cache entries above'
+                             ' this size')
+    parser.add_argument('--cache-refs', action='store_true',
+                        help='Also cache the .text reference index so new'
+                             ' heuristics can skip rescanning')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Neither read nor write the extraction cache')
+    parser.add_argument('--identify', action='store_true',
+                        help='Only report which known version the exe is')
+    parser.add_argument('--force', action='store_true',
+                        help='Run the full extraction even for known versions')
+    parser.add_argument('--delta', action='store_true',
+                        help='Search near the closest known version first,'
+                             ' widening to full scans only where needed')
+    parser.add_argument('--profile', action='store_true',
+                        help='Trace peak memory per stage and print a stage'
+                             ' metrics table')
+    parser.add_argument('--profile-stage', metavar='STAGE',
+                        help='Run this stage (e.g. text_scan) under cProfile'
+                             ' and dump its stats to STAGE.prof')
+    parser.add_argument('--metrics-json', metavar='PATH',
+                        help='Write per-stage metrics to PATH as JSON')
+    args = parser.parse_args()
+
+    metrics_args = None
+    if args.profile or args.profile_stage or args.metrics_json:
+        metrics_args = {'trace_memory': args.profile,
+                        'profile_stage': args.profile_stage}
+
+    use_numpy = False if args.no_numpy else None
+    cache_dir = None if args.no_cache else args.cache_dir
+    if len(args.exe) > 1 or Path(args.exe[0]).is_dir():
+        if args.dump_globals or args.globals_index or args.version_name:
+            parser.error("batch mode does not support --dump-globals,"
+                         " --globals-index or --version-name")
+        if args.profile_stage:
+            parser.error("--profile-stage needs a single exe")
+        batch_main(args.exe, jobs=args.jobs, use_numpy=use_numpy,
+                   use_mmap=not args.no_mmap, cache_dir=cache_dir,
+                   cache_refs=args.cache_refs, metrics=metrics_args,
+                   metrics_json=args.metrics_json)
+        return
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s',
+                        stream=sys.stdout)
+    path = Path(args.exe[0])
+    if not path.exists():
+        print(f"ERROR: {path} not found")
+        sys.exit(1)
+
+    # Fast path: known builds are identified from their headers and a
+    # streaming MD5, and reported from KNOWN_VERSIONS without scanning.
+    header = None
+    if args.identify or not (args.force or args.dump_globals
+                             or args.globals_index):
+        md5, header = identify_known_version(path)
+        if args.identify:
+            if md5:
+                print(f"{KNOWN_VERSIONS[md5]['name']} (MD5 {md5})")
+            else:
+                print(f"Unknown build (SizeOfImage {header.size_of_image},"
+                      f" TimeDateStamp 0x{header.timestamp:08x},"
+                      f" CheckSum 0x{header.checksum:08x})")
+            return
+        if md5:
+            print(f"Identified {path.name} as a known version"
+                  f" (--force to re-extract)")
+            print()
+            print_report(args.version_name or KNOWN_VERSIONS[md5]['name'],
+                         md5, header.file_size(), header.size_of_image,
+                         known_addresses(md5))
+            return
+
+    metrics = StageMetrics(**(metrics_args or {}))
+    print(f"Loading {path.name}...")
+    with metrics.stage('load') as counts:
+        pe = PEFile(path, use_mmap=not args.no_mmap)
+        counts['sections'] = len(pe.sections)
+    if header is not None and header._md5 is not None:
+        pe._md5 = header._md5  # Already streamed while identifying
+
+    with metrics.stage('md5'):
+        md5 = pe.md5()
+    file_size = pe.file_size()
+    print(f"  MD5:         {md5}")
+    print(f"  File size:   {file_size}")
+    print(f"  SizeOfImage: {pe.size_of_image} (ModuleMemorySize)")
+    print()
+
+    if args.dump_globals:
+        print("Dumping globals...")
+        globals_map = dump_globals(pe)
+        paths = write_globals_index(args.dump_globals, md5,
+                                    pe.size_of_image, globals_map)
+        print(f"  Found {len(globals_map):,} globals")
+        for p in paths:
+            print(f"  Wrote {p}")
+        return
+
+    globals_map = None
+    if args.globals_index:
+        index_md5, _, globals_map = load_globals_index(args.globals_index)
+        if index_md5 != md5:
+            print(f"  WARNING: index was built from {index_md5}, not this exe")
+            print()
+
+    cache = None
+    if cache_dir:
+        cache = ExtractionCache(cache_dir, args.cache_max_mb << 20)
+    addresses = extract_pe(pe, use_numpy=use_numpy, globals_map=globals_map,
+                           jobs=args.jobs, cache=cache,
+                           cache_refs=args.cache_refs, delta=args.delta,
+                           metrics=metrics).addresses
+    version_name = args.version_name
+    if not version_name and md5 in KNOWN_VERSIONS:
+        version_name = KNOWN_VERSIONS[md5]['name']
+    print_report(version_name or "Unknown", md5, file_size,
+                 pe.size_of_image, addresses)
+
     # Validation against known versions
     if md5 in KNOWN_VERSIONS:
         print("--- Validation ---")
         validate(md5, addresses)
 
+    if args.profile:
+        metrics.print_summary()
+    if args.metrics_json:
+        Path(args.metrics_json).write_text(json.dumps(
+            {'path': str(path), 'md5': md5, 'stages': metrics.as_list()},
+            indent=1) + '\n')
+
 
 if __name__ == '__main__':
     main()
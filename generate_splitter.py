@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Splitter Table Generator
+
+Regenerates the parts of windswept.asl and ce_script.lua that restate
+data kept in Python, so that each fact has one source:
+
+- the ASL state() blocks and the init() version checks, and the Cheat
+  Engine script's version table, from extract_addresses.KNOWN_VERSIONS;
+- the ASL's per-stage tables (name, exits, comet/cloud flags, moons),
+  from split_rules.LEVEL_DATA. startup builds the settings tree and
+  the setting key of every watched slot from them, and update resolves
+  those keys into the split plan once per run (see
+  split_rules.SplitPlan).
+
+Each generated region sits between <generated:NAME> and
+</generated:NAME> marker comments; everything outside them is left as
+it is. Edit KNOWN_VERSIONS or LEVEL_DATA, then run this.
+
+Usage:
+    python generate_splitter.py [--check] [--asl windswept.asl]
+                                [--lua ce_script.lua]
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+
+from extract_addresses import (KNOWN_VERSIONS, VARIABLES, format_asl_init,
+                               format_asl_state, known_addresses)
+from split_rules import LEVEL_DATA, akc_supported
+
+HERE = Path(__file__).resolve().parent
+
+# Entries per line in the generated C# array initializers
+NAMES_PER_LINE = 4
+VALUES_PER_LINE = 20
+
+# The Cheat Engine script only edits the arrays
+LUA_KEYS = [an for vn, an in VARIABLES if vn.startswith('array_')]
+
+
+def _region(name, comment):
+    return re.compile(rf'(?m)(^[ \t]*{re.escape(comment)} <generated:{name}>'
+                      rf'[^\n]*\n).*?(^[ \t]*{re.escape(comment)}'
+                      rf' </generated:{name}>)', re.S)
+
+
+def replace_region(text, name, body, comment='//'):
+    """text with the lines between name's markers replaced by body."""
+    pattern = _region(name, comment)
+    if not pattern.search(text):
+        raise ValueError(f"no <generated:{name}> region")
+    return pattern.sub(lambda m: m.group(1) + body + '\n' + m.group(2), text,
+                       count=1)
+
+
+def _newest_first():
+    return list(KNOWN_VERSIONS.items())[::-1]
+
+
+def asl_states():
+    """Every build's state() block, newest first."""
+    return '\n\n'.join(format_asl_state(known['name'], known_addresses(md5))
+                       for md5, known in _newest_first())
+
+
+def asl_versions():
+    """The init() checks that name the build from its size and MD5."""
+    return '\n\t\n'.join(
+        format_asl_init(known['name'], md5, known['moduleSize'],
+                        akc_supported(known))
+        for md5, known in KNOWN_VERSIONS.items())
+
+
+def _cs_string(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _cs_array(name, type_, values, per_line):
+    lines = [f'\tvars.{name} = new {type_}[] {{']
+    for i in range(0, len(values), per_line):
+        lines.append('\t\t' + ', '.join(values[i:i + per_line]) + ',')
+    lines[-1] = lines[-1][:-1]
+    lines.append('\t};')
+    return lines
+
+
+def asl_stages():
+    """The per-stage tables, indexed by stage."""
+    stages = sorted(LEVEL_DATA)
+    if stages != list(range(len(stages))):
+        raise ValueError("LEVEL_DATA must cover stages 0..n-1")
+    levels = [LEVEL_DATA[stage] for stage in stages]
+
+    def flag(value):
+        return 'true' if value else 'false'
+
+    lines = []
+    lines += _cs_array('stageNames', 'string',
+                       [_cs_string(level.name) for level in levels],
+                       NAMES_PER_LINE)
+    lines += _cs_array('stageExits', 'int',
+                       [str(level.exits) for level in levels], VALUES_PER_LINE)
+    lines += _cs_array('stageHasComet', 'bool',
+                       [flag(level.has_comet) for level in levels],
+                       VALUES_PER_LINE // 2)
+    lines += _cs_array('stageHasCloud', 'bool',
+                       [flag(level.has_cloud) for level in levels],
+                       VALUES_PER_LINE // 2)
+    lines += _cs_array('stageMoons', 'int',
+                       [str(level.moons) for level in levels], VALUES_PER_LINE)
+    return '\n'.join(lines)
+
+
+def lua_versions():
+    """The body of ce_script.lua's versions table, newest first."""
+    entries = []
+    for _, known in _newest_first():
+        fields = [f'        globalDataHashMap = 0x{known["globalData"]:X}']
+        fields += [f'        {key} = 0x{known[key]:X}'
+                   for key in LUA_KEYS if key in known]
+        entries.append(f'    [{_cs_string(known["name"])}] = {{\n'
+                       + ',\n'.join(fields) + '\n    }')
+    return ',\n'.join(entries)
+
+
+def generate(asl_text, lua_text):
+    """The regenerated (asl_text, lua_text)."""
+    asl_text = replace_region(asl_text, 'states', asl_states())
+    asl_text = replace_region(asl_text, 'versions', asl_versions())
+    asl_text = replace_region(asl_text, 'stages', asl_stages())
+    lua_text = replace_region(lua_text, 'versions', lua_versions(), '--')
+    return asl_text, lua_text
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Regenerate windswept.asl and ce_script.lua tables")
+    parser.add_argument('--asl', type=Path, default=HERE / 'windswept.asl')
+    parser.add_argument('--lua', type=Path, default=HERE / 'ce_script.lua')
+    parser.add_argument('--check', action='store_true',
+                        help='Only report files that are out of date'
+                             ' (exit status 1 if any are)')
+    args = parser.parse_args()
+
+    paths = (args.asl, args.lua)
+    old = [path.read_text(encoding='utf-8') for path in paths]
+    try:
+        new = generate(*old)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+
+    stale = [path for path, a, b in zip(paths, old, new) if a != b]
+    for path, text in zip(paths, new):
+        if path not in stale:
+            continue
+        if args.check:
+            print(f"{path} is out of date")
+        else:
+            path.write_text(text, encoding='utf-8')
+            print(f"Wrote {path}")
+    if args.check and stale:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1111 @@
+#!/usr/bin/env python3
+"""
+Windswept Live Memory Reader (Linux / Proton)
+
+Reads the autosplitter variables from a running Windswept.exe through
+/proc/<pid>/mem, doing the same GlobalData -> GMVarHashmap -> RValue
+walk as windswept.asl. Each key's resolved RValue pointer is cached and
+only re-probed when the hashmap header (data pointer, capacity, count)
+changes.
+
+A tick is gathered as one ReadPlan: every address needed (pointer
+chain, header, scalars, watched arrays) is known from the last tick, so
+they are fetched together with a single process_vm_readv scatter/gather
+call, or the fewest coalesced /proc/<pid>/mem reads, and the pointers
+read back are checked against the cached ones. Only if something moved
+is the chain walked again.
+
+The plan is kept from tick to tick and re-read as a few spans that are
+compared with the last tick's bytes, so only arrays whose bytes changed
+are decoded again, and a tick where nothing changed decodes nothing.
+While the game timer is paused (stageType <= 3 or timerStop > 0, as in
+isLoading) the poll loop also drops to --idle-hz.
+
+Any file whose offsets are addresses can stand in for /proc/<pid>/mem;
+synthetic_process.py writes such an image for testing.
+
+Usage:
+    python live_reader.py [--pid PID] [--hz 60] [--idle-hz 10]
+    python live_reader.py --image fake.mem --base 0x140000000 --md5 MD5
+"""
+
+import argparse
+import ctypes
+import errno
+import os
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from extract_addresses import KNOWN_VERSIONS, identify_known_version
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional; snapshots fall back to struct decoding.
+
+PROCESS_NAME = 'Windswept.exe'
+
+# GameMaker layout; see the comments in windswept.asl
+CINSTANCE_HASHMAP = 0x48
+HASHMAP_HEADER = struct.Struct('<iiiiQ')  # capacity, count, mask, threshold, data
+BUCKET = struct.Struct('<QiI')            # value (RValue*), key, hash
+BUCKET_SIZE = BUCKET.size
+ARRAY_DATA = 0x8
+ARRAY_LENGTH = 0x24
+ARRAY_FIELDS_SIZE = ARRAY_LENGTH + 4 - ARRAY_DATA
+RVALUE_SIZE = 16
+RVALUE_TYPE_ARRAY = 2
+if np is not None:
+    BUCKET_DTYPE = np.dtype([('value', '<u8'), ('key', '<i4'), ('hash', '<u4')])
+    # The RValue union seen as a real and as a pointer at once
+    RVALUE_DTYPE = np.dtype({'names': ['real', 'pointer', 'flags', 'type'],
+                             'formats': ['<f8', '<u8', '<u4', '<u4'],
+                             'offsets': [0, 0, 8, 12], 'itemsize': RVALUE_SIZE})
+    ARRAY_FIELDS_DTYPE = np.dtype({
+        'names': ['data', 'length'], 'formats': ['<u8', '<i4'],
+        'offsets': [0, ARRAY_LENGTH - ARRAY_DATA],
+        'itemsize': ARRAY_FIELDS_SIZE})
+
+# Buckets fetched per read while probing; most chains are shorter.
+PROBE_RUN = 8
+# Resolving at least this many keys at once reads the whole bucket array
+# in one go instead of probing for each.
+SNAPSHOT_MIN_KEYS = 4
+
+# Batched reads: ranges less than a page apart are fetched as one span,
+# and process_vm_readv takes at most IOV_MAX ranges per call.
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+COALESCE_GAP = PAGE_SIZE
+IOV_MAX = 1024
+# Ranges of a changed span that ReadPlan.refresh compares as one block
+# before comparing them one by one
+REFRESH_GROUP = 16
+
+SCALARS = {
+    'stage_type': 'stageTypeIndex',
+    'room_frame_count': 'frameCountRoomIndex',
+    'timer_stop': 'timerStopIndex',
+    'game_time': 'timerFullIndex',
+}
+
+# Arrays the split block reads: (element cap, inner width). Comet shards
+# and moon coins are per-stage arrays of up to 5 inner arrays' values.
+ARRAYS = {
+    'arrayStageClearIndex': (None, None),
+    'arrayCometCoinIndex': (100, None),
+    'arrayCloudCoinsIndex': (100, None),
+    'arrayCometShardIndex': (100, 5),
+    'arrayMoonCoinsIndex': (100, 5),
+}
+STAGE_COUNT = 61  # Stages 0-60; 60 is Home
+
+# Polls per second while the game timer is paused (see PollClock)
+IDLE_HZ = 10
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _process_vm_readv = _libc.process_vm_readv
+    _process_vm_readv.argtypes = [
+        ctypes.c_int, ctypes.POINTER(_IOVec), ctypes.c_ulong,
+        ctypes.POINTER(_IOVec), ctypes.c_ulong, ctypes.c_ulong]
+    _process_vm_readv.restype = ctypes.c_ssize_t
+except (OSError, AttributeError):
+    _process_vm_readv = None  # Not Linux; fall back to coalesced reads.
+
+
+def coalesce(requests, gap=COALESCE_GAP):
+    """Group (address, size) requests into spans at most gap bytes apart.
+
+    Returns [(start, end, [request indices])], sorted by address.
+    """
+    order = sorted(range(len(requests)), key=lambda i: requests[i][0])
+    spans = []
+    for i in order:
+        address, size = requests[i]
+        if spans and address <= spans[-1][1] + gap:
+            span = spans[-1]
+            span[1] = max(span[1], address + size)
+            span[2].append(i)
+        else:
+            spans.append([address, address + size, [i]])
+    return [tuple(span) for span in spans]
+
+
+class ProcessMemory:
+    """Reads from /proc/<pid>/mem, or from an image file of one.
+
+    reads counts the read syscalls issued, for comparing strategies.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.fd = os.open(self.path, os.O_RDONLY)
+        self.reads = 0
+
+    @classmethod
+    def for_pid(cls, pid):
+        """Memory of pid, batched through process_vm_readv if available."""
+        if _process_vm_readv is not None:
+            return ProcessVMMemory(pid)
+        return cls(f"/proc/{pid}/mem")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def read(self, address, size):
+        self.reads += 1
+        data = os.pread(self.fd, size, address)
+        if len(data) != size:
+            raise OSError(errno.EFAULT, f"short read at 0x{address:x}")
+        return data
+
+    def read_u64(self, address):
+        return struct.unpack('<Q', self.read(address, 8))[0]
+
+    def read_i32(self, address):
+        return struct.unpack('<i', self.read(address, 4))[0]
+
+    def read_f64(self, address):
+        return struct.unpack('<d', self.read(address, 8))[0]
+
+    def read_many(self, requests):
+        """Read many (address, size) ranges; return a memoryview for each.
+
+        Nearby ranges are merged into one pread per span. A span that
+        fails (e.g. it covers an unmapped gap) is retried range by range.
+        """
+        results = [None] * len(requests)
+        for start, end, members in coalesce(requests):
+            try:
+                view = memoryview(self.read(start, end - start))
+            except OSError:
+                if len(members) == 1:
+                    raise
+                for i in members:
+                    results[i] = memoryview(self.read(*requests[i]))
+                continue
+            for i in members:
+                address, size = requests[i]
+                results[i] = view[address - start:address - start + size]
+        return results
+
+
+class ProcessVMMemory(ProcessMemory):
+    """ProcessMemory whose read_many is one process_vm_readv per IOV_MAX.
+
+    Single reads still go through /proc/<pid>/mem, which is also the
+    fallback when process_vm_readv is refused.
+    """
+
+    def __init__(self, pid):
+        super().__init__(f"/proc/{pid}/mem")
+        self.pid = pid
+
+    def read_many(self, requests):
+        total = sum(size for _, size in requests)
+        if not total:
+            return [memoryview(b'')] * len(requests)
+        buffer = bytearray(total)
+        target = (ctypes.c_char * total).from_buffer(buffer)
+        base = ctypes.addressof(target)
+        offsets = []
+        offset = 0
+        for _, size in requests:
+            offsets.append(offset)
+            offset += size
+
+        for first in range(0, len(requests), IOV_MAX):
+            batch = requests[first:first + IOV_MAX]
+            local = (_IOVec * len(batch))()
+            remote = (_IOVec * len(batch))()
+            for j, (address, size) in enumerate(batch):
+                local[j] = _IOVec(base + offsets[first + j], size)
+                remote[j] = _IOVec(address, size)
+            self.reads += 1
+            wanted = sum(size for _, size in batch)
+            got = _process_vm_readv(self.pid, local, len(batch),
+                                    remote, len(batch), 0)
+            if got != wanted:
+                # Partial or refused: redo this batch the slow way
+                views = super().read_many(batch)
+                for j, view in enumerate(views):
+                    o = offsets[first + j]
+                    buffer[o:o + len(view)] = view
+
+        view = memoryview(buffer)
+        return [view[o:o + size] for o, (_, size) in zip(offsets, requests)]
+
+
+class ReadPlan:
+    """A batch of reads issued together and decoded from one result.
+
+    add() queues a range and returns its slot; after execute(memory),
+    plan[slot] is that range's bytes.
+
+    A plan can be kept and re-read tick after tick with refresh(),
+    which reports which slots changed since the last tick.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.results = None
+        self._spans = None
+        self._span_bytes = None
+
+    def add(self, address, size):
+        self.requests.append((address, size))
+        return len(self.requests) - 1
+
+    def add_many(self, addresses, sizes):
+        """Queue a run of ranges; returns their slots as a range.
+
+        sizes is one size for all of them, or a size per address.
+        """
+        first = len(self.requests)
+        if isinstance(sizes, int):
+            self.requests.extend((address, sizes) for address in addresses)
+        else:
+            self.requests.extend(zip(addresses, sizes))
+        return range(first, len(self.requests))
+
+    def join(self, slots):
+        """The bytes of several slots, concatenated."""
+        return b''.join(self.results[slot] for slot in slots)
+
+    def execute(self, memory):
+        self.results = memory.read_many(self.requests)
+        return self
+
+    def refresh(self, memory):
+        """Read the plan again; return the slots whose bytes changed.
+
+        The ranges are read as their coalesced spans, each compared with
+        its bytes from the last refresh (a memcmp). Within a span that
+        differs, groups of ranges and then the ranges of differing
+        groups are compared, and only changed ranges are sliced again;
+        the others keep their results. The first refresh reports every
+        slot.
+        """
+        if self._spans is None:
+            self._set_spans(COALESCE_GAP)
+        try:
+            views = memory.read_many(self._span_requests)
+        except OSError:
+            # A merged span crossed unmapped memory; merge only ranges
+            # that touch from now on
+            self._set_spans(0)
+            views = memory.read_many(self._span_requests)
+
+        results = self.results
+        changed = []
+        for k, (groups, view) in enumerate(zip(self._groups, views)):
+            raw = bytes(view)
+            old = self._span_bytes[k]
+            if raw == old:
+                continue
+            self._span_bytes[k] = raw
+            view = memoryview(raw)
+            for lo, hi, members in groups:
+                if old is not None and raw[lo:hi] == old[lo:hi]:
+                    continue
+                for i, offset, end in members:
+                    if old is None or raw[offset:end] != old[offset:end]:
+                        results[i] = view[offset:end]
+                        changed.append(i)
+        return changed
+
+    def _set_spans(self, gap):
+        """Coalesce the ranges into spans, and each span's ranges into
+        groups of REFRESH_GROUP compared as one before range by range."""
+        self._spans = coalesce(self.requests, gap)
+        self._span_requests = [(start, end - start)
+                               for start, end, _ in self._spans]
+        self._span_bytes = [None] * len(self._spans)
+        self._groups = []
+        for start, _, members in self._spans:
+            members = [(i, self.requests[i][0] - start,
+                        self.requests[i][0] - start + self.requests[i][1])
+                       for i in members]
+            self._groups.append([
+                (min(m[1] for m in group), max(m[2] for m in group), group)
+                for group in (members[j:j + REFRESH_GROUP]
+                              for j in range(0, len(members), REFRESH_GROUP))])
+        self.results = [None] * len(self.requests)
+
+    def __getitem__(self, slot):
+        return self.results[slot]
+
+    def u64(self, slot):
+        return struct.unpack_from('<Q', self.results[slot])[0]
+
+    def i32(self, slot):
+        return struct.unpack_from('<i', self.results[slot])[0]
+
+    def f64(self, slot):
+        return struct.unpack_from('<d', self.results[slot])[0]
+
+
+def find_pid(name=PROCESS_NAME):
+    """PID of the first process whose comm is name, or None."""
+    for entry in Path('/proc').iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            if (entry / 'comm').read_text().strip() == name:
+                return int(entry.name)
+        except OSError:
+            continue  # Exited, or not ours to read
+    return None
+
+
+def find_module(pid, name=PROCESS_NAME):
+    """(base address, file path) of a module mapped into pid, or None.
+
+    Wine maps PE images from their Linux paths, so the exe can be found
+    (and hashed) straight from /proc/<pid>/maps.
+    """
+    base = path = None
+    with open(f"/proc/{pid}/maps") as maps:
+        for line in maps:
+            fields = line.split(maxsplit=5)
+            if len(fields) < 6 or Path(fields[5].strip()).name.lower() != name.lower():
+                continue
+            start = int(fields[0].split('-')[0], 16)
+            if base is None or start < base:
+                base, path = start, fields[5].strip()
+    return (base, path) if base is not None else None
+
+
+def hash_key(key):
+    """GMVarHashmap hash of a variable index."""
+    return (key + 1) & 0x7fffffff
+
+
+class GMVarHashmap:
+    """Cached lookups in a GameMaker GMVarHashmap (Robin Hood hashing).
+
+    Probing mirrors HashmapLookup in windswept.asl. Resolved RValue
+    pointers (and misses, as 0) are cached per key; check() re-reads the
+    header and drops the cache when the data pointer, capacity or count
+    has changed, i.e. when the map may have been rehashed or grown.
+    snapshot() instead reads every bucket at once, after which any key
+    is a dict lookup until the header changes.
+    """
+
+    def __init__(self, memory, address):
+        self.memory = memory
+        self.address = address
+        self.capacity = self.count = self.mask = self.data = 0
+        self._cache = {}
+        self._complete = False
+        self.probes = 0
+
+    def check(self):
+        """Re-read the header; return True if the cache was dropped."""
+        capacity, count, mask, _, data = HASHMAP_HEADER.unpack(
+            self.memory.read(self.address, HASHMAP_HEADER.size))
+        if (data, capacity, count) == (self.data, self.capacity, self.count):
+            return False
+        self.capacity, self.count, self.mask, self.data = (
+            capacity, count, mask, data)
+        self._cache.clear()
+        self._complete = False
+        return True
+
+    def lookup(self, key):
+        """RValue pointer for key, or 0 if it isn't in the map."""
+        value = self._cache.get(key)
+        if value is None:
+            if self._complete:
+                return 0
+            value = self._cache[key] = self._probe(key)
+        return value
+
+    def snapshot(self):
+        """Read the whole bucket array; return {key: RValue pointer}.
+
+        One capacity * 0x10 byte read, decoded as a NumPy structured
+        array where available. Fills the lookup cache with every live key.
+        """
+        if not self.data or self.capacity <= 0:
+            return {}
+        raw = self.memory.read(self.data, self.capacity * BUCKET_SIZE)
+        if np is not None:
+            buckets = np.frombuffer(raw, dtype=BUCKET_DTYPE)
+            live = buckets[buckets['hash'] != 0]
+            pointers = dict(zip(live['key'].tolist(), live['value'].tolist()))
+        else:
+            pointers = {key: value for value, key, bucket_hash
+                        in BUCKET.iter_unpack(raw) if bucket_hash}
+        self._cache = dict(pointers)
+        self._complete = True
+        return pointers
+
+    def pointers(self):
+        """{key: RValue pointer} of every live key, snapshotting if the
+        cache isn't already complete."""
+        return self._cache if self._complete else self.snapshot()
+
+    def _probe(self, key):
+        if not self.data or self.capacity <= 0:
+            return 0
+        self.probes += 1
+        target = hash_key(key)
+        index = target & self.mask
+        psl = 0
+        while psl < self.capacity:
+            run = min(PROBE_RUN, self.capacity - index, self.capacity - psl)
+            raw = self.memory.read(self.data + index * BUCKET_SIZE,
+                                   run * BUCKET_SIZE)
+            for value, _, bucket_hash in BUCKET.iter_unpack(raw):
+                if bucket_hash == target:
+                    return value
+                if bucket_hash == 0:
+                    return 0
+                bucket_psl = ((self.capacity - (self.mask & bucket_hash))
+                              + index) & self.mask
+                if psl > bucket_psl:
+                    return 0
+                psl += 1
+                index = (index + 1) & self.mask
+        return 0
+
+
+@dataclass(slots=True)
+class GameState:
+    """One tick's worth of the values windswept.asl reads in update.
+
+    arrays holds the watched arrays (see LiveReader.watch): the value
+    of each RValue, as a zero-copy NumPy view, with nested arrays as
+    dense (stages, width) matrices. Without NumPy they are tuples (of
+    tuples).
+    """
+    room: int
+    stage_type: float
+    room_frame_count: float
+    timer_stop: float
+    game_time: float
+    arrays: dict = field(default_factory=dict)
+
+
+class _ArrayWatch:
+    """Cached pointer chain of a watched array: RValue -> metadata -> data.
+
+    For nested arrays, inner_metas is the ArrayMetadata pointer of each
+    outer element (0 where it isn't an array), rows the outer indices
+    that are arrays, and inner_data / inner_lengths their data pointers
+    and lengths, capped at width.
+    """
+    __slots__ = ('limit', 'width', 'rvalue', 'meta', 'data', 'length',
+                 'inner_metas', 'rows', 'inner_data', 'inner_lengths')
+
+    def __init__(self, limit, width=None):
+        self.limit = limit
+        self.width = width
+        self.rvalue = self.meta = self.data = 0
+        self.length = 0
+        self.inner_metas = []
+        self.rows = []
+        self.inner_data = []
+        self.inner_lengths = []
+
+
+class LiveReader:
+    """Polls the autosplitter variables of one Windswept process.
+
+    addresses is the KNOWN_VERSIONS entry (RVAs) for the running build.
+    poll() issues one ReadPlan per tick while the cached pointer chains
+    hold, and walks them again (a few dependent reads) when they don't.
+    """
+
+    def __init__(self, memory, module_base, addresses):
+        self.memory = memory
+        self.module_base = module_base
+        self.addresses = addresses
+        self.keys = {}
+        self.watches = {}
+        self.resolves = 0
+        self._instance = 0
+        self._hashmap = None
+        self._rvalues = {}
+        self._tick = None
+        self._last = None
+
+    @classmethod
+    def attach(cls, pid=None):
+        """Attach to a running game, identifying its build from the exe."""
+        pid = pid or find_pid()
+        if pid is None:
+            raise OSError(errno.ESRCH, f"{PROCESS_NAME} is not running")
+        module = find_module(pid)
+        if module is None:
+            raise OSError(errno.ENOENT, f"{PROCESS_NAME} not mapped in {pid}")
+        base, exe = module
+        md5, _ = identify_known_version(exe)
+        if md5 is None:
+            raise ValueError(f"{exe} is not a known version")
+        return cls(ProcessMemory.for_pid(pid), base, KNOWN_VERSIONS[md5])
+
+    def watch(self, name, limit=None, width=None):
+        """Include a global array (e.g. 'arrayStageClearIndex') in poll().
+
+        limit caps the number of elements read, like the ASL's 100. With
+        width, elements are arrays themselves and the first width values
+        of each are read, as a (stages, width) matrix.
+        """
+        if name in self.addresses:
+            self.watches[name] = _ArrayWatch(limit, width)
+            self._tick = self._last = None
+
+    def index(self, name):
+        """Variable key stored at an index slot, or None until set."""
+        key = self.keys.get(name)
+        if key is None and name in self.addresses:
+            key = self.memory.read_i32(self.module_base + self.addresses[name])
+            if key == -1:
+                return None  # Not initialized yet; retry next tick
+            self.keys[name] = key
+        return key
+
+    def hashmap(self):
+        """GlobalData's hashmap, header-checked for this tick."""
+        self._instance = self.memory.read_u64(
+            self.module_base + self.addresses['globalData'])
+        address = self.memory.read_u64(self._instance + CINSTANCE_HASHMAP)
+        if self._hashmap is None or self._hashmap.address != address:
+            self._hashmap = GMVarHashmap(self.memory, address)
+        self._hashmap.check()
+        return self._hashmap
+
+    def rvalue(self, name, hashmap=None):
+        """RValue pointer of the global whose index slot is name, or 0."""
+        key = self.index(name)
+        if key is None:
+            return 0
+        return (hashmap or self.hashmap()).lookup(key)
+
+    def read_double(self, name, hashmap=None):
+        pointer = self.rvalue(name, hashmap)
+        return self.memory.read_f64(pointer) if pointer else None
+
+    def read_array(self, name, limit=None, hashmap=None):
+        """First 8 bytes of each RValue of a global array, as doubles."""
+        pointer = self.rvalue(name, hashmap)
+        if not pointer:
+            return None
+        meta = self.memory.read_u64(pointer)
+        data = self.memory.read_u64(meta + ARRAY_DATA)
+        length = self.memory.read_i32(meta + ARRAY_LENGTH)
+        if limit is not None:
+            length = min(length, limit)
+        if length <= 0:
+            return []
+        raw = self.memory.read(data, length * RVALUE_SIZE)
+        return decode_doubles(raw, length)
+
+    def dump(self):
+        """Every live global, sorted by key, for debugging.
+
+        Entries are (key, index name or None, RValue pointer, value as a
+        double, flags, type), from one snapshot of the bucket array plus
+        one ReadPlan for the RValues.
+        """
+        pointers = self.hashmap().snapshot()
+        names = {}
+        for name in self.addresses:
+            if name.endswith('Index') and self.index(name) is not None:
+                names[self.keys[name]] = name
+        keys = sorted(key for key, pointer in pointers.items() if pointer)
+        plan = ReadPlan()
+        slots = [plan.add(pointers[key], RVALUE_SIZE) for key in keys]
+        plan.execute(self.memory)
+        return [(key, names.get(key), pointers[key],
+                 *struct.unpack('<dII', plan[slot]))
+                for key, slot in zip(keys, slots)]
+
+    def regions(self, all_globals=False):
+        """Memory the cached pointer chains cover, as (address, size, field).
+
+        field is the GameState field a range holds (room and the
+        scalars' RValues) or None. Together the ranges are everything
+        poll() reads, plus the index slots; with all_globals also the
+        bucket array and every global's RValue, which is what a
+        recording needs for a replay to walk the chains from scratch.
+        """
+        base = self.module_base
+        ranges = [(base + self.addresses['room'], 4, 'room'),
+                  (base + self.addresses['globalData'], 8, None)]
+        ranges += [(base + rva, 8, None) for name, rva in self.addresses.items()
+                   if name.endswith('Index')]
+        hashmap = self._hashmap
+        if hashmap is None:
+            return ranges
+        ranges.append((self._instance + CINSTANCE_HASHMAP, 8, None))
+        ranges.append((hashmap.address, HASHMAP_HEADER.size, None))
+        fields = {name: field for field, name in SCALARS.items()}
+        ranges += [(pointer, RVALUE_SIZE, fields[name])
+                   for name, pointer in self._rvalues.items() if pointer]
+        for watch in self.watches.values():
+            if not watch.rvalue:
+                continue
+            ranges.append((watch.rvalue, RVALUE_SIZE, None))
+            ranges.append((watch.meta, ARRAY_LENGTH + 4, None))
+            length = _clamp(watch.length, watch.limit)
+            if length:
+                ranges.append((watch.data, length * RVALUE_SIZE, None))
+            ranges += [(watch.inner_metas[i], ARRAY_LENGTH + 4, None)
+                       for i in watch.rows]
+            ranges += [(data, n * RVALUE_SIZE, None) for data, n
+                       in zip(watch.inner_data, watch.inner_lengths) if n]
+        if all_globals and hashmap.data and hashmap.capacity > 0:
+            ranges.append((hashmap.data, hashmap.capacity * BUCKET_SIZE, None))
+            ranges += [(pointer, RVALUE_SIZE, None)
+                       for pointer in hashmap.pointers().values() if pointer]
+        return ranges
+
+    def _resolve(self):
+        """Walk every pointer chain again, refreshing the cached pointers."""
+        self.resolves += 1
+        self._tick = self._last = None
+        hashmap = self.hashmap()
+        if len(SCALARS) + len(self.watches) >= SNAPSHOT_MIN_KEYS:
+            hashmap.snapshot()
+        self._rvalues = {name: self.rvalue(name, hashmap)
+                         for name in SCALARS.values()}
+        for name, watch in self.watches.items():
+            watch.rvalue = self.rvalue(name, hashmap)
+            watch.meta = watch.data = watch.length = 0
+            if watch.rvalue:
+                watch.meta = self.memory.read_u64(watch.rvalue)
+                raw = self.memory.read(watch.meta + ARRAY_DATA,
+                                       ARRAY_FIELDS_SIZE)
+                watch.data, watch.length = _array_fields(raw)
+        self._resolve_inner([w for w in self.watches.values()
+                             if w.width is not None and w.rvalue])
+
+    def _resolve_inner(self, watches):
+        """Refresh the inner array pointers of nested watches.
+
+        Two batched reads in all: every outer element array, then every
+        inner ArrayMetadata.
+        """
+        plan = ReadPlan()
+        outer = [plan.add(w.data, _clamp(w.length, w.limit) * RVALUE_SIZE)
+                 for w in watches]
+        plan.execute(self.memory)
+        metas = [_array_pointers(plan[slot]) for slot in outer]
+
+        plan = ReadPlan()
+        fields = []
+        for watch, watch_metas in zip(watches, metas):
+            watch.inner_metas = watch_metas
+            watch.rows = [i for i, m in enumerate(watch_metas) if m]
+            fields.append(plan.add_many(
+                [watch_metas[i] + ARRAY_DATA for i in watch.rows],
+                ARRAY_FIELDS_SIZE))
+        plan.execute(self.memory)
+        for watch, slots in zip(watches, fields):
+            data, lengths = _decode_array_fields(plan.join(slots))
+            watch.inner_data = data
+            watch.inner_lengths = [min(max(n, 0), watch.width) for n in lengths]
+
+    def _tick_plan(self):
+        """The ReadPlan of a cached tick, kept until the next pointer walk.
+
+        Returns (plan, slots): slots holds the slot of globalData, room,
+        the hashmap pointer and header, a {field: slot} of the scalars,
+        and per watched array (RValue slot, fields slot, data slot or
+        None, length, inner fields and data slots or None, every slot).
+        """
+        hashmap = self._hashmap
+        plan = ReadPlan()
+        global_data = plan.add(self.module_base + self.addresses['globalData'], 8)
+        room = plan.add(self.module_base + self.addresses['room'], 4)
+        hashmap_ptr = plan.add(self._instance + CINSTANCE_HASHMAP, 8)
+        header = plan.add(hashmap.address, HASHMAP_HEADER.size)
+        scalars = {field: plan.add(self._rvalues[name], 8)
+                   for field, name in SCALARS.items() if self._rvalues.get(name)}
+        arrays = {}
+        for name, watch in self.watches.items():
+            if not watch.rvalue:
+                continue
+            first = len(plan.requests)
+            length = _clamp(watch.length, watch.limit)
+            inner = None
+            if watch.width is not None:
+                inner = (
+                    plan.add_many([watch.inner_metas[i] + ARRAY_DATA
+                                   for i in watch.rows], ARRAY_FIELDS_SIZE),
+                    plan.add_many(watch.inner_data,
+                                  [n * RVALUE_SIZE for n in watch.inner_lengths]))
+            arrays[name] = (
+                plan.add(watch.rvalue, 8),
+                plan.add(watch.meta + ARRAY_DATA, ARRAY_FIELDS_SIZE),
+                plan.add(watch.data, length * RVALUE_SIZE) if length else None,
+                length, inner, frozenset(range(first, len(plan.requests))))
+        return plan, (global_data, room, hashmap_ptr, header, scalars, arrays)
+
+    def _poll_cached(self):
+        """Read the tick through the cached pointers in one ReadPlan.
+
+        The plan is refreshed rather than rebuilt, so only what changed
+        since the last tick is checked and decoded: an array whose bytes
+        are unchanged keeps its last value, and if none changed the
+        state shares the last state's arrays dict. A tick where nothing
+        changed at all decodes nothing.
+
+        Returns None if any pointer read back differs from the cache.
+        """
+        hashmap = self._hashmap
+        if hashmap is None or any(
+                name in self.addresses and name not in self.keys
+                for name in (*SCALARS.values(), *self.watches)):
+            return None  # Never walked, or an index is still unset
+        if self._tick is None:
+            self._tick = self._tick_plan()
+        plan, (global_data, room, hashmap_ptr, header, scalars,
+               arrays) = self._tick
+        changed = plan.refresh(self.memory)
+        last = self._last
+        if not changed and last is not None:
+            return GameState(last.room, last.stage_type, last.room_frame_count,
+                             last.timer_stop, last.game_time, last.arrays)
+
+        capacity, count, _, _, data = HASHMAP_HEADER.unpack(plan[header])
+        if (plan.u64(global_data) != self._instance
+                or plan.u64(hashmap_ptr) != hashmap.address
+                or (data, capacity, count) != (hashmap.data, hashmap.capacity,
+                                               hashmap.count)):
+            self._tick = None
+            return None
+
+        values = {field: None for field in SCALARS}
+        values.update((field, plan.f64(slot)) for field, slot in scalars.items())
+        state = GameState(room=plan.i32(room), **values)
+        changed = set(changed)
+        if last is not None and all(
+                entry[5].isdisjoint(changed) for entry in arrays.values()):
+            state.arrays = last.arrays
+            self._last = state
+            return state
+
+        for name, (rvalue, fields, data_slot, length, inner,
+                   slots) in arrays.items():
+            if last is not None and slots.isdisjoint(changed):
+                state.arrays[name] = last.arrays[name]
+                continue
+            watch = self.watches[name]
+            if (plan.u64(rvalue) != watch.meta
+                    or _array_fields(plan[fields]) != (watch.data, watch.length)):
+                self._tick = None
+                return None
+            raw = plan[data_slot] if data_slot is not None else b''
+            if inner is None:
+                state.arrays[name] = decode_doubles(raw, length)
+                continue
+            fields_slots, data_slots = inner
+            data, lengths = _decode_array_fields(plan.join(fields_slots))
+            if (_array_pointers(raw) != watch.inner_metas
+                    or data != watch.inner_data
+                    or [min(max(n, 0), watch.width) for n in lengths]
+                    != watch.inner_lengths):
+                self._tick = None
+                return None
+            state.arrays[name] = _matrix(
+                length, watch.width, watch.rows, watch.inner_lengths,
+                plan.join(data_slots))
+        self._last = state
+        return state
+
+    def poll(self):
+        """Read room, the update-block scalars and the watched arrays."""
+        state = self._poll_cached()
+        if state is None:
+            self._resolve()
+            state = self._poll_cached()
+        if state is None:
+            raise OSError(errno.EAGAIN, "game state changed while reading")
+        return state
+
+
+def timer_paused(state):
+    """Whether isLoading's stageType or timerStop test holds for state."""
+    return ((state.stage_type is not None and state.stage_type <= 3)
+            or (state.timer_stop is not None and state.timer_stop > 0))
+
+
+class PollClock:
+    """Paces a poll loop at hz, dropping to idle_hz while the game timer
+    is paused (timer_paused).
+
+    The game time doesn't advance while paused, so a split seen on a
+    slower tick still gets the game time it would have had. Deadlines
+    follow a fixed schedule, so a slow tick doesn't delay the rest.
+    """
+
+    def __init__(self, hz, idle_hz=IDLE_HZ):
+        self.interval = 1 / hz
+        self.idle_interval = 1 / min(idle_hz, hz) if idle_hz else self.interval
+        self.deadline = time.perf_counter()
+
+    def wait(self, state):
+        """Sleep until the next tick is due after one that read state."""
+        paused = state is not None and timer_paused(state)
+        self.deadline += self.idle_interval if paused else self.interval
+        time.sleep(max(0.0, self.deadline - time.perf_counter()))
+
+
+def _array_fields(raw):
+    """(data pointer, length) from ArrayMetadata bytes +0x8..+0x28."""
+    data = struct.unpack_from('<Q', raw, 0)[0]
+    length = struct.unpack_from('<i', raw, ARRAY_LENGTH - ARRAY_DATA)[0]
+    return data, length
+
+
+def _clamp(length, limit):
+    length = max(length, 0)
+    return min(length, limit) if limit is not None else length
+
+
+def decode_rvalues(raw):
+    """Zero-copy NumPy view of an RValue array (see RVALUE_DTYPE)."""
+    return np.frombuffer(raw, dtype=RVALUE_DTYPE)
+
+
+def decode_doubles(raw, length):
+    """The value doubles of length consecutive real RValues."""
+    if np is not None:
+        return decode_rvalues(raw[:length * RVALUE_SIZE])['real']
+    return struct.unpack_from(f'<{length * 2}d', raw)[::2]
+
+
+def _array_pointers(raw):
+    """Pointer of each array-typed RValue in raw, 0 for other types."""
+    if np is not None:
+        rvalues = decode_rvalues(raw)
+        return np.where(rvalues['type'] == RVALUE_TYPE_ARRAY,
+                        rvalues['pointer'], 0).tolist()
+    return [pointer if kind == RVALUE_TYPE_ARRAY else 0
+            for pointer, _, kind in struct.iter_unpack('<QII', raw)]
+
+
+def _decode_array_fields(raw):
+    """Data pointers and lengths of consecutive ArrayMetadata +0x8 reads."""
+    if np is not None:
+        fields = np.frombuffer(raw, dtype=ARRAY_FIELDS_DTYPE)
+        return fields['data'].tolist(), fields['length'].tolist()
+    pairs = [_array_fields(raw[o:o + ARRAY_FIELDS_SIZE])
+             for o in range(0, len(raw), ARRAY_FIELDS_SIZE)]
+    return [d for d, _ in pairs], [n for _, n in pairs]
+
+
+def _matrix(length, width, rows, lengths, raw):
+    """Dense (length, width) matrix of inner array values.
+
+    raw holds the values of the given rows back to back, lengths[i]
+    RValues for rows[i]; everything else is zero. When every row is full
+    width (the usual case) this is a single reshape of the buffer.
+    """
+    if np is None:
+        matrix = [(0.0,) * width for _ in range(length)]
+        offset = 0
+        for row, n in zip(rows, lengths):
+            values = decode_doubles(raw[offset:offset + n * RVALUE_SIZE], n)
+            matrix[row] = tuple(values) + (0.0,) * (width - n)
+            offset += n * RVALUE_SIZE
+        return tuple(matrix)
+
+    matrix = np.zeros((length, width))
+    values = decode_rvalues(raw)['real']
+    if all(n == width for n in lengths):
+        matrix[rows] = values.reshape(-1, width)
+        return matrix
+    offset = 0
+    for row, n in zip(rows, lengths):
+        matrix[row, :n] = values[offset:offset + n]
+        offset += n
+    return matrix
+
+
+def newly_set(old, new, threshold=1):
+    """Mask of elements of new that are >= threshold but weren't in old.
+
+    old and new are GameState.arrays values from consecutive ticks. A
+    missing old (the first tick) reports nothing as new; elements beyond
+    old's shape (the array grew) compare against 0.
+    """
+    if np is None:
+        if old is None:
+            old = ()
+            new_mask = False
+        else:
+            new_mask = True
+        return tuple(
+            newly_set(old[i] if i < len(old) else None, v, threshold)
+            if isinstance(v, tuple)
+            else new_mask and v >= threshold
+            and not (i < len(old) and old[i] >= threshold)
+            for i, v in enumerate(new))
+
+    new = np.asarray(new)
+    if old is None:
+        return np.zeros(new.shape, dtype=bool)
+    old = np.asarray(old)
+    if old.shape != new.shape:
+        padded = np.zeros(new.shape)
+        common = tuple(slice(0, min(a, b)) for a, b in zip(old.shape, new.shape))
+        padded[common] = old[common]
+        old = padded
+    return (new >= threshold) & (old < threshold)
+
+
+def _count_set(values, threshold=1):
+    if np is not None:
+        return int((np.asarray(values) >= threshold).sum())
+    return sum(_count_set(v, threshold) if isinstance(v, tuple)
+               else v >= threshold for v in values)
+
+
+def _positions(mask):
+    """Index tuples of the True elements of a newly_set mask."""
+    if np is not None:
+        return [tuple(p) for p in np.argwhere(np.asarray(mask)).tolist()]
+    positions = []
+    for i, m in enumerate(mask):
+        if isinstance(m, tuple):
+            positions.extend((i, *p) for p in _positions(m))
+        elif m:
+            positions.append((i,))
+    return positions
+
+
+def stage_matrices(arrays, stages=STAGE_COUNT):
+    """Per-stage collectables from GameState.arrays as dense matrices.
+
+    Returns stageClears (stages, 2), cometCoins and cloudCoins
+    (stages,), and cometShards and moonCoins (stages, 5); arrays that
+    weren't watched or are too short are zero-filled. Needs NumPy.
+    """
+    if np is None:
+        raise RuntimeError("stage_matrices needs NumPy, which is not installed")
+
+    def fit(values, shape):
+        out = np.zeros(shape)
+        if values is not None:
+            values = np.asarray(values)[:shape[0]]
+            out[(slice(0, len(values)),) + (slice(None),) * (len(shape) - 1)] = values
+        return out
+
+    clears = arrays.get('arrayStageClearIndex')
+    if clears is not None:
+        clears = np.asarray(clears)[:len(clears) // 2 * 2].reshape(-1, 2)
+    return {
+        'stageClears': fit(clears, (stages, 2)),
+        'cometCoins': fit(arrays.get('arrayCometCoinIndex'), (stages,)),
+        'cloudCoins': fit(arrays.get('arrayCloudCoinsIndex'), (stages,)),
+        'cometShards': fit(arrays.get('arrayCometShardIndex'), (stages, 5)),
+        'moonCoins': fit(arrays.get('arrayMoonCoinsIndex'), (stages, 5)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Poll Windswept's autosplitter variables under Proton")
+    parser.add_argument('--pid', type=int,
+                        help=f'Process ID (default: find {PROCESS_NAME})')
+    parser.add_argument('--image',
+                        help='Read this process image file instead of a'
+                             ' live process (needs --base and --md5)')
+    parser.add_argument('--base', type=lambda s: int(s, 0),
+                        help='Module base address in the image')
+    parser.add_argument('--md5', help='KNOWN_VERSIONS build of the image')
+    parser.add_argument('--hz', type=float, default=60,
+                        help='Polls per second (default: 60)')
+    parser.add_argument('--idle-hz', type=float, default=IDLE_HZ,
+                        help='Polls per second while the game timer is'
+                             f' paused (default: {IDLE_HZ}; 0 for --hz)')
+    parser.add_argument('--ticks', type=int,
+                        help='Stop after this many polls')
+    parser.add_argument('--arrays', action='store_true',
+                        help='Also poll the stage clear and coin arrays')
+    parser.add_argument('--dump', action='store_true',
+                        help='Print every GlobalData variable once and exit')
+    args = parser.parse_args()
+
+    if args.image:
+        if args.base is None or args.md5 not in KNOWN_VERSIONS:
+            parser.error("--image needs --base and a known --md5")
+        reader = LiveReader(ProcessMemory(args.image), args.base,
+                            KNOWN_VERSIONS[args.md5])
+    else:
+        try:
+            reader = LiveReader.attach(args.pid)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+    if args.dump:
+        entries = reader.dump()
+        print(f"{len(entries)} globals (hashmap capacity"
+              f" {reader.hashmap().capacity})")
+        for key, name, pointer, value, flags, kind in entries:
+            print(f"  {key:6d} {name or '':22s} 0x{pointer:012x}"
+                  f" type {kind:2d} flags 0x{flags:x} value {value!r}")
+        reader.memory.close()
+        return
+    if args.arrays:
+        for name, (limit, width) in ARRAYS.items():
+            reader.watch(name, limit, width)
+
+    clock = PollClock(args.hz, args.idle_hz)
+    last = None
+    previous = {}
+    arrays = ''
+    ticks = 0
+    try:
+        while args.ticks is None or ticks < args.ticks:
+            state = reader.poll()
+            if state.arrays is not previous:
+                arrays = ', '.join(f"{name}: {_count_set(values)} set"
+                                   for name, values in state.arrays.items())
+            line = (f"room {state.room}, stageType {state.stage_type},"
+                    f" frameCountRoom {state.room_frame_count},"
+                    f" timerStop {state.timer_stop},"
+                    f" timerFull {state.game_time}"
+                    + (f"; {arrays}" if arrays else ''))
+            if line != last:
+                print(line, flush=True)
+                last = line
+            for name, values in state.arrays.items():
+                if name in previous and values is not previous[name]:
+                    for position in _positions(newly_set(previous[name], values)):
+                        print(f"  newly set: {name}{list(position)}", flush=True)
+            previous = state.arrays
+            ticks += 1
+            clock.wait(state)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.memory.close()
+    if ticks:
+        print(f"{ticks} ticks, {reader.memory.reads / ticks:.1f} reads/tick,"
+              f" {reader.resolves} pointer walks", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Windswept Minidump Reader
+
+Triage for missed-split reports: reads the autosplitter variables out
+of a Windows minidump (.dmp) of Windswept.exe, as live_reader.py reads
+them from a running game.
+
+The dump is memory-mapped, never read whole: its memory ranges
+(MemoryListStream and, for full-memory dumps, Memory64ListStream) are
+indexed by start address, so each read is a binary search plus a slice
+of the mapping, and only the pages actually touched are paged in: a
+triage is a few dozen reads whatever the size of the dump.
+Windswept.exe's base comes from the ModuleListStream and its build
+from KNOWN_VERSIONS: of the builds with the module's size, the one
+whose index slots sit after pointers to the right global names (the
+game's global table layout) wins.
+
+Usage:
+    python minidump_reader.py crash.dmp [--md5 MD5] [--json out.json]
+    python minidump_reader.py crash.dmp --dump
+"""
+
+import argparse
+import bisect
+import errno
+import json
+import mmap
+import struct
+import sys
+from dataclasses import dataclass
+from pathlib import PureWindowsPath
+
+from extract_addresses import KNOWN_VERSIONS, VARIABLES
+from live_reader import ARRAYS, PROCESS_NAME, LiveReader, ProcessMemory
+from split_rules import LEVEL_DATA, SHARD_LETTERS
+
+MINIDUMP_SIGNATURE = 0x504D444D  # 'MDMP'
+MINIDUMP_HEADER = struct.Struct('<IIIIIIQ')  # signature, version, streams, directory rva, ...
+MINIDUMP_DIRECTORY = struct.Struct('<III')   # stream type, data size, rva
+MINIDUMP_MODULE = struct.Struct('<QIIII')    # base, size, checksum, timestamp, name rva
+MINIDUMP_MODULE_SIZE = 108
+MEMORY_DESCRIPTOR = struct.Struct('<QII')    # start, data size, rva
+MEMORY64_DESCRIPTOR = struct.Struct('<QQ')   # start, data size
+
+MODULE_LIST_STREAM = 4
+MEMORY_LIST_STREAM = 5
+MEMORY64_LIST_STREAM = 9
+
+# Longest global name read back from a name pointer
+MAX_NAME = 64
+
+
+@dataclass(slots=True)
+class DumpModule:
+    """A MINIDUMP_MODULE: where an image was loaded."""
+    base: int
+    size: int
+    checksum: int
+    timestamp: int
+    path: str
+
+    @property
+    def name(self):
+        return PureWindowsPath(self.path).name
+
+
+class Minidump(ProcessMemory):
+    """A memory-mapped Windows minidump, readable like a process.
+
+    Reads outside the captured ranges raise OSError (EFAULT), like
+    unmapped memory in a live process.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.reads = 0
+        self.fd = None
+        self._file = open(path, 'rb')
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.mm, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+            # Reads are small and scattered; readahead would only page in
+            # (and keep resident) memory nobody asked for.
+            self.mm.madvise(mmap.MADV_RANDOM)
+
+        signature, _, count, directory, _, _, _ = MINIDUMP_HEADER.unpack_from(
+            self.mm, 0)
+        if signature != MINIDUMP_SIGNATURE:
+            self.close()
+            raise ValueError(f"{path} is not a minidump")
+        self.streams = {}
+        for i in range(count):
+            kind, size, rva = MINIDUMP_DIRECTORY.unpack_from(
+                self.mm, directory + i * MINIDUMP_DIRECTORY.size)
+            self.streams.setdefault(kind, (rva, size))
+        self.modules = self._modules()
+
+        ranges = sorted(self._memory_ranges())
+        self.starts, self.ends, self.offsets = [], [], []
+        for start, size, offset in ranges:
+            if self.ends and start < self.ends[-1]:
+                continue  # Already covered (the same range in both lists)
+            self.starts.append(start)
+            self.ends.append(start + size)
+            self.offsets.append(offset)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+            self._file.close()
+
+    def _modules(self):
+        if MODULE_LIST_STREAM not in self.streams:
+            return []
+        rva, _ = self.streams[MODULE_LIST_STREAM]
+        (count,) = struct.unpack_from('<I', self.mm, rva)
+        modules = []
+        for i in range(count):
+            base, size, checksum, timestamp, name_rva = MINIDUMP_MODULE.unpack_from(
+                self.mm, rva + 4 + i * MINIDUMP_MODULE_SIZE)
+            (length,) = struct.unpack_from('<I', self.mm, name_rva)
+            path = self.mm[name_rva + 4:name_rva + 4 + length].decode(
+                'utf-16-le', errors='replace')
+            modules.append(DumpModule(base, size, checksum, timestamp, path))
+        return modules
+
+    def _memory_ranges(self):
+        """Yield (start address, size, file offset) of every range."""
+        if MEMORY64_LIST_STREAM in self.streams:
+            rva, _ = self.streams[MEMORY64_LIST_STREAM]
+            count, offset = struct.unpack_from('<QQ', self.mm, rva)
+            table = self.mm[rva + 16:rva + 16 + count * MEMORY64_DESCRIPTOR.size]
+            for start, size in MEMORY64_DESCRIPTOR.iter_unpack(table):
+                yield start, size, offset
+                offset += size
+        if MEMORY_LIST_STREAM in self.streams:
+            rva, _ = self.streams[MEMORY_LIST_STREAM]
+            (count,) = struct.unpack_from('<I', self.mm, rva)
+            table = self.mm[rva + 4:rva + 4 + count * MEMORY_DESCRIPTOR.size]
+            for start, size, offset in MEMORY_DESCRIPTOR.iter_unpack(table):
+                yield start, size, offset
+
+    @property
+    def memory_size(self):
+        return sum(end - start for start, end in zip(self.starts, self.ends))
+
+    def module(self, name=PROCESS_NAME):
+        """The module whose file name is name, or None."""
+        for module in self.modules:
+            if module.name.lower() == name.lower():
+                return module
+        return None
+
+    def read(self, address, size):
+        self.reads += 1
+        i = bisect.bisect_right(self.starts, address) - 1
+        if i >= 0 and address + size <= self.ends[i]:
+            offset = self.offsets[i] + address - self.starts[i]
+            return self.mm[offset:offset + size]
+
+        # Spanning ranges that are contiguous in memory
+        chunks = []
+        pos, end = address, address + size
+        while pos < end:
+            if i < 0 or i >= len(self.starts) or not (
+                    self.starts[i] <= pos < self.ends[i]):
+                raise OSError(errno.EFAULT, f"0x{pos:x} is not in the dump")
+            n = min(self.ends[i], end) - pos
+            offset = self.offsets[i] + pos - self.starts[i]
+            chunks.append(self.mm[offset:offset + n])
+            pos += n
+            i += 1
+        return b''.join(chunks)
+
+
+def global_name(memory, slot):
+    """Name of the global whose index slot is at slot, from the pointer
+    before it, or None if it can't be read."""
+    try:
+        raw = memory.read(memory.read_u64(slot - 8), MAX_NAME)
+    except OSError:
+        return None
+    name, nul, _ = raw.partition(b'\x00')
+    return name.decode('ascii', errors='replace') if nul else None
+
+
+def identify_build(memory, module):
+    """(md5, matched, candidates) for the KNOWN_VERSIONS build a module is.
+
+    Candidates are the builds of the module's size; each scores a point
+    per index slot preceded by a pointer to its global's name. md5 is
+    None if no candidate matched any.
+    """
+    var_names = {an: vn for vn, an in VARIABLES}
+    candidates = [md5 for md5, known in KNOWN_VERSIONS.items()
+                  if known['moduleSize'] == module.size]
+    best, best_score = None, 0
+    for md5 in candidates:
+        known = KNOWN_VERSIONS[md5]
+        score = sum(global_name(memory, module.base + known[an]) == vn
+                    for an, vn in var_names.items() if an in known)
+        if score > best_score:
+            best, best_score = md5, score
+    return best, best_score, candidates
+
+
+def triage(path, md5=None):
+    """Read a dump's autosplitter state; returns a JSON-able dict."""
+    with Minidump(path) as dump:
+        report = {'path': str(path), 'ranges': len(dump.starts),
+                  'memoryBytes': dump.memory_size}
+        module = dump.module()
+        if module is None:
+            raise ValueError(f"{PROCESS_NAME} is not in {path}")
+        report['module'] = {'base': module.base, 'size': module.size,
+                            'path': module.path}
+        if md5 is None:
+            md5, matched, candidates = identify_build(dump, module)
+            report['identify'] = {'matched': matched,
+                                  'candidates': len(candidates)}
+            if md5 is None:
+                raise ValueError(f"no known build of size {module.size}"
+                                 f" matches {path}")
+        report['md5'] = md5
+        report['build'] = KNOWN_VERSIONS[md5]['name']
+
+        reader = LiveReader(dump, module.base, KNOWN_VERSIONS[md5])
+        for name, (limit, width) in ARRAYS.items():
+            reader.watch(name, limit, width)
+        state = reader.poll()
+        report['state'] = {
+            'room': state.room, 'stageType': state.stage_type,
+            'frameCountRoom': state.room_frame_count,
+            'timerStop': state.timer_stop, 'timerFull': state.game_time,
+        }
+        report['stages'] = stage_table(state.arrays)
+        report['reads'] = dump.reads
+    return report
+
+
+def _at(values, *index):
+    """values[i][j]..., or None where the array is missing or too short."""
+    for i in index:
+        if values is None or i >= len(values):
+            return None
+        values = values[i]
+    return float(values)
+
+
+def stage_table(arrays):
+    """Per-stage clears and collectables from GameState.arrays."""
+    clears = arrays.get('arrayStageClearIndex')
+    stages = []
+    for stage, level in LEVEL_DATA.items():
+        entry = {'stage': stage, 'name': level.name,
+                 'exits': [_at(clears, stage * 2 + e) for e in range(level.exits)]}
+        if level.has_comet:
+            entry['cometCoin'] = _at(arrays.get('arrayCometCoinIndex'), stage)
+            entry['cometShards'] = [_at(arrays.get('arrayCometShardIndex'), stage, i)
+                                    for i in range(len(SHARD_LETTERS))]
+        if level.moons:
+            entry['moonCoins'] = [_at(arrays.get('arrayMoonCoinsIndex'), stage, i)
+                                  for i in range(level.moons)]
+        if level.has_cloud:
+            entry['cloudCoin'] = _at(arrays.get('arrayCloudCoinsIndex'), stage)
+        stages.append(entry)
+    return stages
+
+
+def _flags(values, labels=None):
+    """'CO-E-' style summary: a label (or the value) per collected entry."""
+    if values is None:
+        return ''
+    out = []
+    for i, value in enumerate(values):
+        if value is None:
+            out.append('?')
+        elif value >= 1:
+            out.append(labels[i] if labels else f"{value:g}")
+        else:
+            out.append('-')
+    return ''.join(out) if labels else ' '.join(out)
+
+
+def print_report(report):
+    module = report['module']
+    print(f"{report['path']}: {report['ranges']} memory ranges,"
+          f" {report['memoryBytes'] / (1 << 20):.1f} MB")
+    print(f"  {PROCESS_NAME} at 0x{module['base']:x} (size {module['size']})")
+    identify = report.get('identify')
+    print(f"  Build: {report['build']}"
+          + (f" ({identify['matched']} index slots named as expected,"
+             f" {identify['candidates']} builds of this size)"
+             if identify else ''))
+    state = report['state']
+    print(f"  room {state['room']}, stageType {state['stageType']},"
+          f" frameCountRoom {state['frameCountRoom']},"
+          f" timerStop {state['timerStop']}, timerFull {state['timerFull']}")
+    print()
+    print(f"  {'Stage':28s} {'Exits':7s} {'Coin':4s} {'Shards':6s}"
+          f" {'Moons':5s} {'Cloud':5s}")
+    for entry in report['stages']:
+        coin = entry.get('cometCoin')
+        cloud = entry.get('cloudCoin')
+        print(f"  {entry['stage']:2d} {entry['name']:25s}"
+              f" {_flags(entry['exits']):7s}"
+              f" {_flags([coin], 'C') if 'cometCoin' in entry else '':4s}"
+              f" {_flags(entry.get('cometShards'), SHARD_LETTERS):6s}"
+              f" {_flags(entry.get('moonCoins'), '12345'):5s}"
+              f" {_flags([cloud], 'C') if 'cloudCoin' in entry else '':5s}")
+    print()
+    print(f"  {report['reads']} reads")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Read Windswept's autosplitter state from a minidump")
+    parser.add_argument('minidump', help='Minidump (.dmp) of Windswept.exe')
+    parser.add_argument('--md5',
+                        help='KNOWN_VERSIONS build of the dumped exe'
+                             ' (default: identify it from the dump)')
+    parser.add_argument('--json', help='Also write the report to this file')
+    parser.add_argument('--dump', action='store_true',
+                        help='Print every GlobalData variable instead')
+    args = parser.parse_args()
+    if args.md5 is not None and args.md5.upper() not in KNOWN_VERSIONS:
+        parser.error(f"{args.md5} is not a known build")
+    md5 = args.md5.upper() if args.md5 else None
+
+    try:
+        if args.dump:
+            with Minidump(args.minidump) as dump:
+                module = dump.module()
+                if module is None:
+                    raise ValueError(f"{PROCESS_NAME} is not in {args.minidump}")
+                md5 = md5 or identify_build(dump, module)[0]
+                if md5 is None:
+                    raise ValueError("could not identify the build")
+                reader = LiveReader(dump, module.base, KNOWN_VERSIONS[md5])
+                entries = reader.dump()
+                print(f"{len(entries)} globals ({KNOWN_VERSIONS[md5]['name']})")
+                for key, name, pointer, value, flags, kind in entries:
+                    print(f"  {key:6d} {name or '':22s} 0x{pointer:012x}"
+                          f" type {kind:2d} flags 0x{flags:x} value {value!r}")
+            return
+        report = triage(args.minidump, md5)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
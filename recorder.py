@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+Windswept Run Recorder and Split Replay
+
+record: polls a running game (or a process image) through LiveReader
+and, every tick, appends the memory reachable from GlobalData -- the
+module's slots, the hashmap header and buckets, every global's RValue
+and the collectable arrays -- to a recording. Only the 16-byte blocks
+that changed since the last tick are stored, so a steady tick is a few
+dozen bytes.
+
+replay: rebuilds that memory tick by tick, reads it back with the same
+LiveReader and runs split_rules.Autosplitter (windswept.asl's start,
+reset, split and isLoading blocks) over it. A tick whose changes only
+touch room and the scalar RValues patches those fields into the last
+state instead of polling, and the split block's array checks are
+skipped while the arrays are untouched, so hours of play replay in
+seconds. --json saves the starts, splits and resets; --baseline fails
+if they differ from a saved run, for checking rule changes against a
+library of recordings.
+
+Recording format (little-endian, append-only): MAGIC, a u32 length and
+a JSON header (build, md5, module base, addresses, tick rate), then per
+tick a FRAME (seconds since recording started, payload size, flags)
+and a payload of RUN (address, length) + bytes records, compressed
+with zlib if flags & FRAME_ZLIB. A truncated last frame (the recorder
+was killed mid-write) is ignored.
+
+Usage:
+    python recorder.py record run.wsrec [--pid PID] [--hz 60] [--idle-hz 10]
+    python recorder.py record run.wsrec --image fake.mem --base 0x140000000 --md5 MD5
+    python recorder.py replay runs/ [--set split_pinwheel=1] [--json out.json]
+                             [--baseline out.json]
+"""
+
+import argparse
+import errno
+import json
+import struct
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from extract_addresses import KNOWN_VERSIONS
+from live_reader import (ARRAYS, IDLE_HZ, PAGE_SIZE, RVALUE_SIZE, GameState,
+                         LiveReader, PollClock, ProcessMemory, coalesce)
+from split_rules import Autosplitter, Settings, akc_supported
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional; falls back to comparing blocks in Python.
+
+MAGIC = b'WSREC\x00\x01\x00'
+HEADER_SIZE = struct.Struct('<I')
+FRAME = struct.Struct('<dIB')   # seconds, payload size, flags
+RUN = struct.Struct('<QI')      # address, length
+ROOM = struct.Struct('<i')
+SCALAR = struct.Struct('<d')
+FRAME_ZLIB = 1
+
+# Granularity of the per-tick diff: one RValue.
+BLOCK = 16
+# Payloads at least this big (the first tick, rehashes) are compressed.
+COMPRESS_MIN = 4096
+# Regions this close together are read and diffed as one span. Less
+# than a page, so a span never covers a page no region is in.
+RECORD_GAP = 256
+# Recordings found in a replay directory
+RECORDING_GLOB = '*.wsrec'
+
+
+class SparseMemory(ProcessMemory):
+    """Memory rebuilt from a recording: the pages written so far.
+
+    Reads touching a page that was never written fail like unmapped
+    memory; the rest of a written page reads as zeros until written.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.fd = None
+        self.reads = 0
+        self.pages = {}
+
+    def has(self, address, size):
+        return all(page in self.pages for page in
+                   range(address // PAGE_SIZE, (address + size - 1) // PAGE_SIZE + 1))
+
+    def write(self, address, data):
+        page, offset = divmod(address, PAGE_SIZE)
+        buffer = self.pages.get(page)
+        if buffer is not None and offset + len(data) <= PAGE_SIZE:
+            buffer[offset:offset + len(data)] = data
+            return
+        pos, end = 0, len(data)
+        while pos < end:
+            page, offset = divmod(address + pos, PAGE_SIZE)
+            n = min(PAGE_SIZE - offset, end - pos)
+            buffer = self.pages.get(page)
+            if buffer is None:
+                buffer = self.pages[page] = bytearray(PAGE_SIZE)
+            buffer[offset:offset + n] = data[pos:pos + n]
+            pos += n
+
+    def read(self, address, size):
+        self.reads += 1
+        page, offset = divmod(address, PAGE_SIZE)
+        if offset + size <= PAGE_SIZE:
+            buffer = self.pages.get(page)
+            if buffer is None:
+                raise OSError(errno.EFAULT, f"unrecorded read at 0x{address:x}")
+            return bytes(buffer[offset:offset + size])
+        chunks = []
+        pos = 0
+        while pos < size:
+            page, offset = divmod(address + pos, PAGE_SIZE)
+            n = min(PAGE_SIZE - offset, size - pos)
+            buffer = self.pages.get(page)
+            if buffer is None:
+                raise OSError(errno.EFAULT,
+                              f"unrecorded read at 0x{address + pos:x}")
+            chunks.append(buffer[offset:offset + n])
+            pos += n
+        return b''.join(chunks)
+
+    def update(self, address, data):
+        """Write data at address; return the (address, bytes) runs that
+        differed from what was there.
+
+        Data landing in pages not seen before is one run in full, so a
+        replay's SparseMemory ends up with exactly the same pages.
+        """
+        if not self.has(address, len(data)):
+            data = bytes(data)
+            self.write(address, data)
+            return [(address, data)]
+        old = self.read(address, len(data))
+        if old == data:
+            return []
+        runs = [(address + start, bytes(data[start:end]))
+                for start, end in changed_blocks(old, data)]
+        for run_address, run in runs:
+            self.write(run_address, run)
+        return runs
+
+
+def changed_blocks(old, new, block=BLOCK):
+    """[(start, end)] byte ranges of the blocks of new differing from old.
+
+    Consecutive changed blocks are merged into one range.
+    """
+    size = len(new)
+    if np is not None:
+        a = np.frombuffer(old, dtype=np.uint8)
+        b = np.frombuffer(new, dtype=np.uint8)
+        whole = size // block * block
+        diff = (a[:whole] != b[:whole]).reshape(-1, block).any(axis=1)
+        if whole < size:
+            diff = np.append(diff, bytes(old[whole:]) != bytes(new[whole:]))
+        changed = np.flatnonzero(diff)
+        if not len(changed):
+            return []
+        breaks = np.flatnonzero(np.diff(changed) != 1)
+        firsts = changed[np.r_[0, breaks + 1]].tolist()
+        lasts = changed[np.r_[breaks, len(changed) - 1]].tolist()
+        return [(first * block, min((last + 1) * block, size))
+                for first, last in zip(firsts, lasts)]
+
+    ranges = []
+    for start in range(0, size, block):
+        end = min(start + block, size)
+        if old[start:end] == new[start:end]:
+            continue
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+class RecordingWriter:
+    """Appends frames to a recording file."""
+
+    def __init__(self, path, header):
+        self.f = open(path, 'wb')
+        raw = json.dumps(header).encode()
+        self.f.write(MAGIC + HEADER_SIZE.pack(len(raw)) + raw)
+        self.bytes_written = self.f.tell()
+        self.frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.f.close()
+
+    def write_frame(self, seconds, runs):
+        payload = b''.join(RUN.pack(address, len(data)) + data
+                           for address, data in runs)
+        flags = 0
+        if len(payload) >= COMPRESS_MIN:
+            payload, flags = zlib.compress(payload), FRAME_ZLIB
+        self.f.write(FRAME.pack(seconds, len(payload), flags) + payload)
+        self.f.flush()
+        self.frames += 1
+        self.bytes_written += FRAME.size + len(payload)
+
+
+class Recording:
+    """A recording file: its header and, lazily, its frames."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = self.path.read_bytes()
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a Windswept recording")
+        pos = len(MAGIC)
+        (size,) = HEADER_SIZE.unpack_from(self.data, pos)
+        pos += HEADER_SIZE.size
+        self.header = json.loads(self.data[pos:pos + size])
+        self._frames_at = pos + size
+
+    def frames(self):
+        """Yield (seconds, [(address, bytes)]) for every complete frame."""
+        data = memoryview(self.data)
+        pos, end = self._frames_at, len(data)
+        while pos + FRAME.size <= end:
+            seconds, size, flags = FRAME.unpack_from(data, pos)
+            pos += FRAME.size
+            if pos + size > end:
+                return  # Truncated by a killed recorder
+            payload = data[pos:pos + size]
+            pos += size
+            if flags & FRAME_ZLIB:
+                payload = memoryview(zlib.decompress(payload))
+            runs = []
+            offset = 0
+            while offset < len(payload):
+                address, length = RUN.unpack_from(payload, offset)
+                offset += RUN.size
+                runs.append((address, payload[offset:offset + length]))
+                offset += length
+            yield seconds, runs
+
+
+class Recorder:
+    """Records a LiveReader's process, one frame per tick().
+
+    The reader's arrays are all watched, and the recorded regions are
+    recomputed whenever it re-walks its pointer chains. state is the
+    last tick's GameState.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.shadow = SparseMemory()
+        self.dropped = 0
+        self.state = None
+        self._spans = None
+        self._resolves = None
+        for name, (limit, width) in ARRAYS.items():
+            reader.watch(name, limit, width)
+
+    def tick(self, seconds):
+        """Record one tick; returns the number of changed runs, or None
+        if the game changed while being read (nothing is written)."""
+        reader = self.reader
+        try:
+            self.state = reader.poll()
+            if reader.resolves != self._resolves:
+                regions = reader.regions(all_globals=True)
+                self._spans = [(start, end - start) for start, end, _ in
+                               coalesce([(a, s) for a, s, _ in regions],
+                                        RECORD_GAP)]
+                self._resolves = reader.resolves
+            results = reader.memory.read_many(self._spans)
+        except OSError:
+            self.dropped += 1
+            return None
+        runs = []
+        for (address, _), data in zip(self._spans, results):
+            runs += self.shadow.update(address, data)
+        self.writer.write_frame(seconds, runs)
+        return len(runs)
+
+
+@dataclass(slots=True)
+class ReplayResult:
+    """What replaying one recording produced."""
+    path: str
+    build: str | None
+    ticks: int = 0
+    seconds: float = 0.0
+    events: list = field(default_factory=list)
+    load_seconds: float = 0.0
+    polls: int = 0
+    patches: int = 0
+    dropped: int = 0
+    replay_seconds: float = 0.0
+
+    def as_dict(self):
+        return {
+            'path': self.path, 'build': self.build, 'ticks': self.ticks,
+            'seconds': round(self.seconds, 3),
+            'loadSeconds': round(self.load_seconds, 3),
+            'events': [{'kind': e.kind, 'tick': e.tick,
+                        'seconds': round(e.seconds, 3),
+                        'gameTime': e.game_time, 'reasons': e.reasons}
+                       for e in self.events],
+        }
+
+
+class Replay:
+    """Runs the split rules over a recording.
+
+    Each frame's runs are written to a SparseMemory. If none of them
+    touch anything the last poll() read, the last state stands; if they
+    only touch room or scalar RValues, those fields are re-read into a
+    copy of it; otherwise the reader polls, re-walking its pointer
+    chains if they moved.
+    """
+
+    def __init__(self, path, settings=None):
+        self.recording = Recording(path)
+        header = self.recording.header
+        self.memory = SparseMemory()
+        self.reader = LiveReader(self.memory, header['moduleBase'],
+                                 header['addresses'])
+        for name, (limit, width) in ARRAYS.items():
+            self.reader.watch(name, limit, width)
+        self.splitter = Autosplitter(settings,
+                                     akc_supported(header['addresses']))
+        self.result = ReplayResult(str(path), header.get('build'))
+        self.state = None
+        self._deps = {}
+        self._fields = {}
+        self._scalars = {}
+
+    def run(self):
+        start = time.perf_counter()
+        for seconds, runs in self.recording.frames():
+            self.step(seconds, runs)
+        result = self.result
+        result.replay_seconds = time.perf_counter() - start
+        result.events = self.splitter.events
+        result.load_seconds = self.splitter.load_seconds
+        return result
+
+    def step(self, seconds, runs):
+        result = self.result
+        result.ticks += 1
+        result.seconds = seconds
+        memory = self.memory
+        deps = self._deps
+        scalars = self._scalars
+        full = self.state is None and bool(runs)
+        dirty = set()
+        for address, data in runs:
+            memory.write(address, data)
+            if full:
+                continue
+            end = address + len(data)
+            name = scalars.get(address)
+            if name is not None and end - address <= RVALUE_SIZE:
+                dirty.add(name)  # Exactly one scalar's RValue
+                continue
+            for page in range(address // PAGE_SIZE, (end - 1) // PAGE_SIZE + 1):
+                for start, stop, name in deps.get(page, ()):
+                    if start < end and address < stop:
+                        if name is None:
+                            full = True
+                            break
+                        dirty.add(name)
+
+        if full:
+            self._poll()
+        elif dirty and self.state is not None:
+            result.patches += 1
+            old = self.state
+            state = self.state = GameState(
+                old.room, old.stage_type, old.room_frame_count,
+                old.timer_stop, old.game_time, old.arrays)
+            pages = memory.pages
+            for name in dirty:
+                page, offset, fmt = self._fields[name]
+                setattr(state, name, fmt.unpack_from(pages[page], offset)[0])
+        if self.state is None:
+            result.dropped += 1
+            return
+        self.splitter.tick(self.state, seconds)
+
+    def _poll(self):
+        self.result.polls += 1
+        try:
+            self.state = self.reader.poll()
+        except OSError:
+            self.state = None  # Moved mid-read, or not in the recording
+            return
+        deps = {}
+        self._fields = {}
+        self._scalars = {}
+        for address, size, name in self.reader.regions():
+            if name is not None:
+                page, offset = divmod(address, PAGE_SIZE)
+                fmt = ROOM if name == 'room' else SCALAR
+                if offset + fmt.size > PAGE_SIZE:
+                    name = None  # Straddles two pages; poll on changes
+                else:
+                    self._fields[name] = (page, offset, fmt)
+                    if name != 'room':
+                        self._scalars[address] = name
+            for page in range(address // PAGE_SIZE,
+                              (address + size - 1) // PAGE_SIZE + 1):
+                deps.setdefault(page, []).append((address, address + size, name))
+        self._deps = deps
+
+
+def _clock(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:06.3f}"
+
+
+def print_result(result):
+    speed = (f"{result.seconds / result.replay_seconds:,.0f}x"
+             if result.replay_seconds else '-')
+    print(f"{result.path} ({result.build or 'unknown build'}):"
+          f" {result.ticks} ticks, {_clock(result.seconds)} recorded,"
+          f" replayed in {result.replay_seconds:.2f} s ({speed})")
+    for event in result.events:
+        print(f"  {event.kind:5s} {_clock(event.seconds)}"
+              f"  igt {_clock(event.game_time / 1000)}"
+              + (f"  {'; '.join(event.reasons)}" if event.reasons else ''))
+    print(f"  loading {_clock(result.load_seconds)};"
+          f" {result.polls} polls, {result.patches} patched ticks,"
+          f" {result.dropped} dropped")
+
+
+def record_main(args, parser):
+    if args.image:
+        if args.base is None or args.md5 not in KNOWN_VERSIONS:
+            parser.error("--image needs --base and a known --md5")
+        reader = LiveReader(ProcessMemory(args.image), args.base,
+                            KNOWN_VERSIONS[args.md5])
+    else:
+        try:
+            reader = LiveReader.attach(args.pid)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+    md5 = next(m for m, v in KNOWN_VERSIONS.items() if v is reader.addresses)
+    header = {'build': reader.addresses.get('name'), 'md5': md5,
+              'moduleBase': reader.module_base,
+              'addresses': reader.addresses, 'hz': args.hz,
+              'idleHz': args.idle_hz}
+    clock = PollClock(args.hz, args.idle_hz)
+    ticks = 0
+    start = time.perf_counter()
+    with RecordingWriter(args.out, header) as writer:
+        recorder = Recorder(reader, writer)
+        try:
+            while args.ticks is None or ticks < args.ticks:
+                recorder.tick(time.perf_counter() - start)
+                ticks += 1
+                clock.wait(recorder.state)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            reader.memory.close()
+    print(f"{writer.frames} frames, {writer.bytes_written:,} bytes"
+          f" ({writer.bytes_written / max(writer.frames, 1):.0f} per frame),"
+          f" {recorder.dropped} dropped", file=sys.stderr)
+
+
+def _settings(args, parser):
+    overrides = {}
+    if args.settings:
+        overrides.update(json.loads(Path(args.settings).read_text()))
+    for item in args.set or ():
+        key, _, value = item.partition('=')
+        overrides[key] = value.lower() not in ('0', 'false', 'off', '')
+    try:
+        return Settings(overrides)
+    except KeyError as e:
+        parser.error(e.args[0])
+
+
+def replay_main(args, parser):
+    paths = []
+    for p in map(Path, args.recordings):
+        paths += sorted(p.glob(RECORDING_GLOB)) if p.is_dir() else [p]
+    if not paths:
+        parser.error("no recordings found")
+
+    results = []
+    for path in paths:
+        result = Replay(path, _settings(args, parser)).run()
+        print_result(result)
+        results.append(result.as_dict())
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=1) + '\n')
+
+    if args.baseline:
+        baseline = {r['path']: r['events']
+                    for r in json.loads(Path(args.baseline).read_text())}
+        changed = [r['path'] for r in results
+                   if r['path'] in baseline and r['events'] != baseline[r['path']]]
+        for path in changed:
+            print(f"CHANGED: {path}")
+        if changed:
+            sys.exit(1)
+        print(f"All {len(results)} recordings match {args.baseline}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record Windswept runs and replay them through the"
+                    " split rules")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='Record a running game')
+    record.add_argument('out', help='Recording to write')
+    record.add_argument('--pid', type=int,
+                        help='Process ID (default: find Windswept.exe)')
+    record.add_argument('--image',
+                        help='Record this process image file instead of a'
+                             ' live process (needs --base and --md5)')
+    record.add_argument('--base', type=lambda s: int(s, 0),
+                        help='Module base address in the image')
+    record.add_argument('--md5', help='KNOWN_VERSIONS build of the image')
+    record.add_argument('--hz', type=float, default=60,
+                        help='Ticks per second (default: 60)')
+    record.add_argument('--idle-hz', type=float, default=IDLE_HZ,
+                        help='Ticks per second while the game timer is'
+                             f' paused (default: {IDLE_HZ}; 0 for --hz)')
+    record.add_argument('--ticks', type=int,
+                        help='Stop after this many ticks')
+
+    replay = commands.add_parser('replay',
+                                 help='Run the split rules over recordings')
+    replay.add_argument('recordings', nargs='+',
+                        help=f'Recordings, or directories of {RECORDING_GLOB}')
+    replay.add_argument('--settings',
+                        help='JSON file of ASL setting -> bool overrides')
+    replay.add_argument('--set', action='append', metavar='KEY=VALUE',
+                        help='Override one ASL setting, e.g.'
+                             ' split_pinwheel=1 (repeatable)')
+    replay.add_argument('--json', help='Write the events of each run here')
+    replay.add_argument('--baseline',
+                        help='Fail if any run\'s events differ from this'
+                             ' --json output')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_main(args, parser)
+    else:
+        replay_main(args, parser)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Windswept Split Rules
+
+The start, reset, split and isLoading blocks of windswept.asl ported to
+Python, run against live_reader.GameState ticks instead of LiveSplit's
+memory watchers, plus enough of LiveSplit's timer (phases, the order
+the blocks run in each tick, the settings tree) to say when a run
+would have started, split and reset.
+
+recorder.py replays recorded runs through Autosplitter to check a
+change to these rules against real play without the game.
+"""
+
+from dataclasses import dataclass, field, replace
+
+from extract_addresses import VARIABLES
+
+# 204 is the Home level used for the opening cutscene; 0 and 1 are the
+# title screen and file select.
+START_ROOM = 204
+RESET_ROOMS = (0, 1)
+HOME_STAGE = 60
+
+# Element caps the ASL reads the flat collectable arrays with
+COLLECTABLE_LIMIT = 100
+STAGE_CLEAR_SLOTS = 200
+SHARD_LETTERS = "COMET"
+
+# The collectable arrays the split block watches, with how its debug
+# output names them, and whether each stage's entry is an inner array
+COLLECTABLES = (
+    ('arrayCometCoinIndex', 'comet coin', False),
+    ('arrayCloudCoinsIndex', 'cloud coin', False),
+    ('arrayCometShardIndex', 'comet shard', True),
+    ('arrayMoonCoinsIndex', 'moon', True),
+)
+
+NOT_RUNNING, RUNNING = 'NotRunning', 'Running'
+
+SCALAR_FIELDS = ('stage_type', 'room_frame_count', 'timer_stop', 'game_time')
+
+
+@dataclass(frozen=True, slots=True)
+class Level:
+    """One stage's exits and collectables."""
+    name: str
+    exits: int
+    has_comet: bool
+    has_cloud: bool
+    moons: int
+
+
+# The stage database; windswept.asl's per-stage tables are generated from
+# it by generate_splitter.py.
+LEVEL_DATA = {
+    0: Level("Guiding Glade", 2, True, True, 3),
+    1: Level("Hoppet Heights", 1, True, True, 3),
+    2: Level("Bridge-Wheel Waterway", 1, True, True, 3),
+    3: Level("Bluppo's Barge", 1, True, True, 2),
+    4: Level("Salamancer's Sanctum", 1, True, True, 3),
+    5: Level("Hue's Shade", 1, True, True, 2),
+    6: Level("Brambles in the Breeze", 1, True, True, 2),
+    7: Level("Octulent's Onslaught", 1, False, True, 0),
+    8: Level("Thornado", 1, True, True, 1),
+    9: Level("Cawbie Cliffs", 1, True, True, 2),
+    10: Level("Nippa's Nook", 1, True, True, 2),
+    11: Level("Pips and Pits", 1, True, True, 2),
+    12: Level("Honey Hop Hollow", 2, True, True, 2),
+    13: Level("Over the Raybow", 1, True, True, 3),
+    14: Level("Grabba's Grotto", 1, True, True, 3),
+    15: Level("Skree's Spire", 1, True, True, 3),
+    16: Level("Beevy Battlefield", 1, True, True, 2),
+    17: Level("The Pip Ship", 1, False, True, 0),
+    18: Level("Calamitous Chasm", 1, True, True, 1),
+    19: Level("Nugget's Snowy Sprint", 1, True, True, 2),
+    20: Level("Temporal Railroad", 1, True, True, 1),
+    21: Level("Aucora's Abyss", 1, True, True, 3),
+    22: Level("Slicko Slide", 2, True, True, 3),
+    23: Level("End of the Raybow", 1, True, True, 2),
+    24: Level("Lunosa's Library", 1, True, True, 5),
+    25: Level("Dizzying Descent", 1, True, True, 1),
+    26: Level("Spicy Ice Speedway", 1, True, True, 2),
+    27: Level("Magmaw Well", 1, True, True, 3),
+    28: Level("Lava Pike Polder", 1, True, True, 2),
+    29: Level("Honey Buzz Boiler", 1, True, True, 2),
+    30: Level("Vexatious Vents", 2, True, True, 2),
+    31: Level("Rusty Reservoir", 1, True, True, 2),
+    32: Level("Smoky Squall", 1, True, True, 2),
+    33: Level("B.V. Broadcast Tower", 1, False, True, 0),
+    34: Level("Sawmill Thrill", 1, True, True, 1),
+    35: Level("Bell's End", 1, True, True, 3),
+    36: Level("Thrillhex Thicket", 2, True, True, 2),
+    37: Level("Shrine of the Salamancer", 1, True, True, 2),
+    38: Level("Prickly Peril", 1, True, True, 2),
+    39: Level("Toxic Tunnel", 1, True, True, 2),
+    40: Level("Cirra's Strife", 1, False, True, 0),
+    41: Level("Baneful Briar", 1, True, True, 1),
+    42: Level("Cirra Superstorm", 1, False, True, 0),
+    43: Level("Cloudy Clamber", 1, True, True, 1),
+    44: Level("Wingbeat Wharf", 1, True, True, 1),
+    45: Level("Turbulent Torrent", 1, True, True, 1),
+    46: Level("Shiver-Sling Spring", 1, True, True, 1),
+    47: Level("Ashen Dash", 1, True, True, 1),
+    48: Level("Sunset Scuttle", 1, True, True, 1),
+    49: Level("Skyward Horde", 1, True, True, 1),
+    50: Level("Pip Pop to the Top", 1, True, True, 1),
+    51: Level("Frigid Flurry", 1, True, True, 1),
+    52: Level("Grabba's Gauntlet", 1, True, True, 1),
+    53: Level("Honey-Side Up", 1, True, True, 1),
+    54: Level("Dire Dire Ducts", 1, True, True, 1),
+    55: Level("Dropdash Chaparral", 1, True, True, 1),
+    56: Level("Dreadmaw's Dwelling", 1, True, True, 1),
+    57: Level("Cyclonic Skyway", 1, True, True, 1),
+    58: Level("Windswept", 1, True, True, 0),
+    59: Level("Windswept EX", 1, True, True, 0),
+    60: Level("Home", 1, False, False, 1),
+}
+
+
+def akc_supported(addresses):
+    """Whether a build's addresses include the collectable arrays."""
+    return all(an in addresses for _, an in VARIABLES[5:])
+
+
+class Settings:
+    """The ASL's settings tree, with its defaults.
+
+    As in LiveSplit, settings[key] is only True when the setting and
+    every setting above it are on.
+    """
+
+    def __init__(self, overrides=None):
+        self.values = {}
+        self.parents = {}
+        self._add('split_on_hitting_spring', False)
+        self._add('split_on_finish_level', True)
+        self._add('split_pinwheel', False, 'split_on_finish_level')
+        self._add('split_akc', False, 'split_pinwheel')
+        for stage, level in LEVEL_DATA.items():
+            self._add(f'split_level_{stage}', True, 'split_on_finish_level')
+            if level.exits > 1:
+                self._add(f'split_level_{stage}_alt', True,
+                          'split_on_finish_level')
+
+        self._add('split_on_collectables', False)
+        for stage, level in LEVEL_DATA.items():
+            if not level.has_comet and not level.has_cloud and level.moons <= 0:
+                continue
+            group = f'split_collectables_level_{stage}'
+            self._add(group, False, 'split_on_collectables')
+            if level.has_comet:
+                shards = f'split_comet_shards_{stage}'
+                self._add(shards, False, group)
+                for letter in SHARD_LETTERS:
+                    self._add(f'split_comet_shard_{letter}_{stage}', False,
+                              shards)
+                self._add(f'split_comet_coin_{stage}', False, group)
+            if level.has_cloud:
+                self._add(f'split_cloud_coin_{stage}', False, group)
+            if level.moons > 0:
+                moons = f'split_moons_{stage}'
+                self._add(moons, False, group)
+                for moon in range(level.moons):
+                    self._add(f'split_moon_{stage}_{moon}', False, moons)
+
+        for key, value in (overrides or {}).items():
+            self.set(key, value)
+
+    def _add(self, key, default, parent=None):
+        self.values[key] = default
+        self.parents[key] = parent
+
+    def set(self, key, value):
+        if key not in self.values:
+            raise KeyError(f"unknown setting {key!r}")
+        self.values[key] = bool(value)
+
+    def __getitem__(self, key):
+        while key is not None:
+            if not self.values[key]:
+                return False
+            key = self.parents[key]
+        return True
+
+
+@dataclass(frozen=True, slots=True)
+class SplitPlan:
+    """The split settings resolved into the slots the split block checks.
+
+    exit_thresholds[slot] is the stage-clear value an exit splits at (0
+    if it isn't split on) and exit_slots the slots that are split on.
+    masks[array][stage] has bit i set if element i of the stage's
+    collectables is split on (bit 0 for the flat coin arrays); stages
+    lists the stages with any bit set, per array.
+
+    windswept.asl resolves the same plan at the start of each run, so
+    the split block never looks up a setting by name.
+    """
+    spring: bool
+    akc: bool
+    exit_thresholds: tuple
+    exit_slots: tuple
+    masks: dict
+    stages: dict
+
+    @classmethod
+    def resolve(cls, settings, akc_supported=True):
+        pinwheel = settings['split_pinwheel']
+        thresholds = [0] * STAGE_CLEAR_SLOTS
+        masks = {name: [0] * COLLECTABLE_LIMIT for name, _, _ in COLLECTABLES}
+        collectables = akc_supported and settings['split_on_collectables']
+        for stage, level in LEVEL_DATA.items():
+            for exit_ in range(min(level.exits, 2)):
+                key = f'split_level_{stage}' + ('_alt' if exit_ else '')
+                if settings[key]:
+                    thresholds[stage * 2 + exit_] = (
+                        2 if pinwheel and stage != HOME_STAGE else 1)
+            if not collectables:
+                continue
+            if level.has_comet:
+                masks['arrayCometCoinIndex'][stage] = int(
+                    settings[f'split_comet_coin_{stage}'])
+                masks['arrayCometShardIndex'][stage] = sum(
+                    1 << si for si, letter in enumerate(SHARD_LETTERS)
+                    if settings[f'split_comet_shard_{letter}_{stage}'])
+            if level.has_cloud:
+                masks['arrayCloudCoinsIndex'][stage] = int(
+                    settings[f'split_cloud_coin_{stage}'])
+            masks['arrayMoonCoinsIndex'][stage] = sum(
+                1 << mi for mi in range(level.moons)
+                if settings[f'split_moon_{stage}_{mi}'])
+
+        return cls(
+            spring=settings['split_on_hitting_spring'],
+            akc=akc_supported and settings['split_akc'],
+            exit_thresholds=tuple(thresholds),
+            exit_slots=tuple(i for i, t in enumerate(thresholds) if t),
+            masks={name: tuple(mask) for name, mask in masks.items()},
+            stages={name: tuple(s for s, bits in enumerate(mask) if bits)
+                    for name, mask in masks.items()})
+
+
+@dataclass(slots=True)
+class TimerEvent:
+    """A start, split or reset the timer would have done on a tick."""
+    kind: str
+    tick: int
+    seconds: float
+    game_time: float
+    reasons: list = field(default_factory=list)
+
+
+def _zero_missing(state):
+    """state with unreadable scalars as 0, as LiveSplit's ReadValue
+    returns for a null pointer."""
+    missing = {name: 0.0 for name in SCALAR_FIELDS
+               if getattr(state, name) is None}
+    return replace(state, **missing) if missing else state
+
+
+def _value(array, index):
+    """array[index] as the ASL's ReadSimpleArrayValue reads it: -1 if
+    the array is missing or too short."""
+    if array is None or index >= len(array):
+        return -1
+    return array[index]
+
+
+def _all_collected(matrix, stage, count):
+    """CheckNestedArrayAllCollected on a (stages, 5) matrix."""
+    if matrix is None or stage >= len(matrix):
+        return False
+    return all(value >= 1 for value in matrix[stage][:count])
+
+
+class Autosplitter:
+    """windswept.asl's update, start, reset, split and isLoading blocks.
+
+    tick() takes one GameState per update and runs the blocks in
+    LiveSplit's order: start while the timer isn't running, otherwise
+    isLoading, then reset, and split only if the run didn't reset.
+    Starts, splits and resets are appended to events; load_seconds is
+    the real time spent with isLoading true while running.
+
+    The settings are resolved into a SplitPlan when the splitter is made
+    and again when each run starts; changing them mid-run takes effect
+    from the next run, as in the ASL.
+
+    The split block's array checks only change when the arrays or the
+    Home stage's stageType gate do, so a tick whose arrays are the very
+    same objects as the last evaluated tick's (as a replay passes when
+    only scalars changed) skips them.
+    """
+
+    def __init__(self, settings=None, akc_supported=True):
+        self.settings = settings or Settings()
+        self.akc_supported = akc_supported
+        self.phase = NOT_RUNNING
+        self.events = []
+        self.load_seconds = 0.0
+        self.ticks = 0
+        self._old = None
+        self._old_phase = NOT_RUNNING
+        self._last_seconds = None
+        self._loading = False
+        self._evaluated = None
+        self._clear_seen()
+
+    def _clear_seen(self):
+        """Resolve the plan and mark every planned split as pending."""
+        self.plan = SplitPlan.resolve(self.settings, self.akc_supported)
+        self.cleared_exits = [False] * STAGE_CLEAR_SLOTS
+        self.cleared_stages_akc = [False] * COLLECTABLE_LIMIT
+        self.pending = {name: list(mask)
+                        for name, mask in self.plan.masks.items()}
+        self._evaluated = None
+
+    def tick(self, state, seconds):
+        """Run one update on state, read seconds into the recording."""
+        tick = self.ticks
+        self.ticks += 1
+        state = _zero_missing(state)
+        old, self._old = self._old, state
+        elapsed = 0.0 if self._last_seconds is None else seconds - self._last_seconds
+        self._last_seconds = seconds
+        if old is None:
+            return  # The ASL's first update only initializes old
+
+        if self.phase == RUNNING and self._old_phase == NOT_RUNNING:
+            self._on_start(state)
+        self._old_phase = self.phase
+
+        if self.phase == NOT_RUNNING:
+            if self.start(state):
+                self.phase = RUNNING
+                self.events.append(TimerEvent('start', tick, seconds,
+                                              state.game_time))
+            return
+
+        # LiveSplit pauses game time from an update where isLoading holds
+        # until the next update, so the time since the last tick was
+        # loading if it held then (which also keeps ticks spaced out by
+        # live_reader.PollClock while paused counted right).
+        if self._loading:
+            self.load_seconds += elapsed
+        self._loading = self.is_loading(state)
+        if self.reset(state):
+            self._loading = False
+            self.phase = NOT_RUNNING
+            self.events.append(TimerEvent('reset', tick, seconds,
+                                          state.game_time))
+            return
+        reasons = self.split(old, state)
+        if reasons:
+            self.events.append(TimerEvent('split', tick, seconds,
+                                          state.game_time, reasons))
+
+    def _on_start(self, state):
+        """The update block's re-plan when a run starts.
+
+        Collectables already collected are taken off the pending masks,
+        so they don't split.
+        """
+        self._clear_seen()
+        self._take_collected(state.arrays)
+
+    def start(self, state):
+        return state.room == START_ROOM
+
+    def reset(self, state):
+        return state.room in RESET_ROOMS
+
+    def is_loading(self, state):
+        # The timer is paused on the title, file select, arcade and
+        # overworld, for a level's first 30 frames, and while timerStop
+        # is set.
+        return (state.stage_type <= 3 or state.room_frame_count < 30
+                or state.timer_stop > 0)
+
+    def split(self, old, current):
+        """The split block; returns why it split (empty if it didn't)."""
+        reasons = []
+
+        # Mode 1: any goal spring. timerStop is 2 from landing on a goal
+        # until walking off screen, and in the opening cutscene (room 204).
+        if (self.plan.spring and current.room != START_ROOM
+                and current.timer_stop == 2 and old.timer_stop == 0):
+            reasons.append("Hit a goal spring")
+
+        key = (current.arrays, current.stage_type > 3)
+        if self._evaluated is not None and (
+                key[0] is self._evaluated[0] and key[1] == self._evaluated[1]):
+            return reasons
+        self._evaluated = key
+
+        # Mode 2: individual comet coins, cloud coins, shards and moons.
+        for name, label, nested, stage, bit in self._take_collected(
+                current.arrays):
+            level = LEVEL_DATA[stage]
+            if name == 'arrayCometShardIndex':
+                label += f' {SHARD_LETTERS[bit]}'
+            elif nested:
+                label += f' {bit}'
+            reasons.append(f"Collected {label} in stage {stage}"
+                           f" ({level.name})")
+        # Mode 3: a level exit completed for the first time.
+        reasons += self._split_stage_clears(current)
+        return reasons
+
+    def _take_collected(self, arrays):
+        """Clear the pending bits of collectables now collected.
+
+        Returns (array, label, nested, stage, bit) for each, in the
+        order the split block reports them.
+        """
+        taken = []
+        for name, label, nested in COLLECTABLES:
+            values = arrays.get(name)
+            if values is None:
+                continue
+            pending = self.pending[name]
+            read_len = min(len(values), COLLECTABLE_LIMIT)
+            for stage in self.plan.stages[name]:
+                bits = pending[stage]
+                if not bits or stage >= read_len:
+                    continue
+                row = values[stage] if nested else (values[stage],)
+                for bit, value in enumerate(row[:bits.bit_length()]):
+                    if bits >> bit & 1 and value >= 1:
+                        pending[stage] &= ~(1 << bit)
+                        taken.append((name, label, nested, stage, bit))
+        return taken
+
+    def _split_stage_clears(self, current):
+        """Split on the planned exits newly at their threshold."""
+        clears = current.arrays.get('arrayStageClearIndex')
+        if clears is None:
+            return []
+        reasons = []
+        plan = self.plan
+        arrays = current.arrays
+        for i in plan.exit_slots:
+            if i >= len(clears):
+                break
+            stage, exit_ = divmod(i, 2)
+            level = LEVEL_DATA[stage]
+            # Home only splits outside levels.
+            if stage == HOME_STAGE and current.stage_type > 3:
+                continue
+            value = clears[i]
+            if self.cleared_exits[i] or value < plan.exit_thresholds[i]:
+                continue
+
+            # AKC gate: require every key collectable, splitting once per
+            # stage; if they're not all in yet, recheck on a later tick.
+            if plan.akc and stage != HOME_STAGE:
+                if self.cleared_stages_akc[stage]:
+                    self.cleared_exits[i] = True
+                    continue
+                if level.has_comet and (
+                        _value(arrays.get('arrayCometCoinIndex'), stage) < 1
+                        or not _all_collected(
+                            arrays.get('arrayCometShardIndex'), stage, 5)):
+                    continue
+                if level.moons > 0 and not _all_collected(
+                        arrays.get('arrayMoonCoinsIndex'), stage, level.moons):
+                    continue
+                if level.has_cloud and _value(
+                        arrays.get('arrayCloudCoinsIndex'), stage) < 1:
+                    continue
+                self.cleared_stages_akc[stage] = True
+
+            self.cleared_exits[i] = True
+            reasons.append(f"Completed stage {stage} ({level.name})"
+                           f" exit {exit_} with value {value}")
+        return reasons
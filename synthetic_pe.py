@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Synthetic Windswept-like PE32+ Generator
+
+Writes fake 64-bit executables laid out the way extract_addresses.py
+expects a GameMaker build to be, so the extractor can be benchmarked and
+checked without shipping real Windswept.exe builds:
+
+- .rdata holds the VARIABLES name strings among many decoy global names.
+- .data holds the global name/index table: a pointer to each name
+  followed by the SENTINEL index slot.
+- .text is random filler densely seeded with RIP-relative MOV/LEA
+  references to random .data/.rdata targets, plus blocks where each
+  variable's index is loaded next to a load of a fake GlobalData (which
+  lives in .data's BSS, like the real one).
+
+A manifest of the planted addresses is written next to each file as
+<file>.json.
+
+Usage:
+    python synthetic_pe.py out.exe [--text-mb 20] [--seed 1]
+"""
+
+import argparse
+import json
+import random
+import struct
+from pathlib import Path
+
+from extract_addresses import ADDRESS_KEYS, ROOM_OFFSET, SENTINEL, VARIABLES
+
+IMAGE_BASE = 0x140000000
+SECTION_ALIGN = 0x1000
+FILE_ALIGN = 0x200
+HEADERS_SIZE = 0x400
+
+# One decoy RIP-relative reference per this many bytes of .text.
+REF_SPACING = 48
+# Each planted index/GlobalData block gets a cell this size to itself,
+# so the +-64 byte scoring windows of different blocks never overlap.
+BLOCK_CELL = 256
+
+
+def _align(value, alignment):
+    return -(-value // alignment) * alignment
+
+
+def _rip_ref(rnd, inst_rva, target):
+    """Encode a random RIP-relative MOV/LEA from inst_rva to target."""
+    modrm = 0x05 | (rnd.randrange(8) << 3)
+    opcode = rnd.choice((0x8B, 0x8D))
+    if rnd.random() < 0.5:
+        disp = target - (inst_rva + 7)
+        return bytes([rnd.choice((0x48, 0x4C)), opcode, modrm]) + struct.pack('<i', disp)
+    disp = target - (inst_rva + 6)
+    return bytes([opcode, modrm]) + struct.pack('<i', disp)
+
+
+def build(path, text_size=1 << 20, seed=1, decoy_globals=2000,
+          sites_per_var=8):
+    """Write a synthetic PE32+ to path and return its manifest dict."""
+    rnd = random.Random(seed)
+
+    # Section layout: .text, .rdata, .data (raw table + BSS tail)
+    names = [vn for vn, _ in VARIABLES]
+    names += [f"global_decoy_{i}" for i in range(decoy_globals)]
+    rnd.shuffle(names)
+
+    rdata_size = _align(sum(len(n) + 1 for n in names) * 2 + 0x10000, FILE_ALIGN)
+    table_stride = 0x20
+    data_raw_size = _align(len(names) * table_stride * 2 + 0x10000, FILE_ALIGN)
+    data_virtual_size = data_raw_size + ROOM_OFFSET + 0x10000
+
+    text_rva = SECTION_ALIGN
+    rdata_rva = text_rva + _align(text_size, SECTION_ALIGN)
+    data_rva = rdata_rva + _align(rdata_size, SECTION_ALIGN)
+    size_of_image = data_rva + _align(data_virtual_size, SECTION_ALIGN)
+
+    # .rdata: filler with the names scattered through it
+    rdata = bytearray(rnd.randbytes(rdata_size))
+    string_rvas = {}
+    pos = 0x100
+    for name in names:
+        raw = name.encode('ascii') + b'\x00'
+        rdata[pos - 1] = 0  # Terminate whatever precedes the name
+        rdata[pos:pos + len(raw)] = raw
+        string_rvas[name] = rdata_rva + pos
+        pos += len(raw) + rnd.randrange(1, 16)
+
+    # .data: the global table, with decoy sentinel pairs in between
+    data = bytearray(data_raw_size)
+    index_rvas = {}
+    pos = 0x1000
+    for name in names:
+        struct.pack_into('<Q', data, pos, IMAGE_BASE + string_rvas[name])
+        data[pos + 8:pos + 16] = SENTINEL
+        index_rvas[name] = data_rva + pos + 8
+        pos += table_stride
+        if rnd.random() < 0.2:
+            struct.pack_into('<Q', data, pos, rnd.getrandbits(64))
+            data[pos + 8:pos + 16] = SENTINEL
+            pos += table_stride
+    global_data = data_rva + data_raw_size + rnd.randrange(0, 0x8000, 8)
+
+    # .text: filler, dense decoy refs, then the planted blocks
+    text = bytearray(rnd.randbytes(text_size))
+    targets = (data_rva, data_rva + data_raw_size, rdata_rva, rdata_rva + rdata_size)
+    for pos in range(0, text_size - 16, REF_SPACING):
+        lo, hi = (targets[0], targets[1]) if rnd.random() < 0.7 else targets[2:]
+        ref = _rip_ref(rnd, text_rva + pos, rnd.randrange(lo, hi))
+        text[pos:pos + len(ref)] = ref
+
+    cells = text_size // BLOCK_CELL - 1
+    asl_names = dict(VARIABLES)
+    needed = len(VARIABLES) * sites_per_var
+    if cells < needed:
+        raise ValueError(f".text too small for {needed} planted blocks")
+    for i, cell in enumerate(rnd.sample(range(1, cells), needed)):
+        var_name = VARIABLES[i % len(VARIABLES)][0]
+        pos = cell * BLOCK_CELL
+        ref = _rip_ref(rnd, text_rva + pos, index_rvas[var_name])
+        text[pos:pos + len(ref)] = ref
+        pos += len(ref) + rnd.randrange(0, 24)
+        ref = _rip_ref(rnd, text_rva + pos, global_data)
+        text[pos:pos + len(ref)] = ref
+
+    sections = [
+        ('.text', text_rva, len(text), text, 0x60000020),
+        ('.rdata', rdata_rva, len(rdata), rdata, 0x40000040),
+        ('.data', data_rva, data_virtual_size, data, 0xC0000040),
+    ]
+    _write_pe(path, sections, size_of_image, rnd.getrandbits(32))
+
+    addresses = {asl_names[vn]: index_rvas[vn] for vn, _ in VARIABLES}
+    addresses['globalData'] = global_data
+    addresses['room'] = global_data + ROOM_OFFSET
+    manifest = {
+        'textSize': text_size, 'seed': seed, 'moduleSize': size_of_image,
+        'globals': len(names),
+        'addresses': {k: addresses[k] for k in ADDRESS_KEYS},
+    }
+    Path(f"{path}.json").write_text(json.dumps(manifest, indent=1) + '\n')
+    return manifest
+
+
+def _write_pe(path, sections, size_of_image, timestamp):
+    headers = bytearray(HEADERS_SIZE)
+    headers[0:2] = b'MZ'
+    struct.pack_into('<I', headers, 0x3C, 0x80)
+    headers[0x80:0x84] = b'PE\x00\x00'
+
+    coff = 0x84
+    struct.pack_into('<HHIIIHH', headers, coff, 0x8664, len(sections),
+                     timestamp, 0, 0, 240, 0x22)
+
+    opt = coff + 20
+    struct.pack_into('<H', headers, opt, 0x20B)
+    struct.pack_into('<I', headers, opt + 16, sections[0][1])  # Entry point
+    struct.pack_into('<Q', headers, opt + 24, IMAGE_BASE)
+    struct.pack_into('<II', headers, opt + 32, SECTION_ALIGN, FILE_ALIGN)
+    struct.pack_into('<II', headers, opt + 56, size_of_image, HEADERS_SIZE)
+    struct.pack_into('<H', headers, opt + 68, 3)  # Console subsystem
+    struct.pack_into('<I', headers, opt + 108, 16)
+
+    raw_offset = HEADERS_SIZE
+    sec_off = opt + 240
+    for i, (name, rva, vsize, raw, flags) in enumerate(sections):
+        o = sec_off + i * 40
+        headers[o:o + 8] = name.encode('ascii').ljust(8, b'\x00')
+        struct.pack_into('<IIII', headers, o + 8, vsize, rva, len(raw), raw_offset)
+        struct.pack_into('<I', headers, o + 36, flags)
+        raw_offset += len(raw)
+
+    with open(path, 'wb') as f:
+        f.write(headers)
+        for section in sections:
+            f.write(section[3])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic Windswept-like PE32+ for benchmarks")
+    parser.add_argument('out', help='Output .exe path')
+    parser.add_argument('--text-mb', type=float, default=20,
+                        help='Size of .text in MB (default: 20)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--decoy-globals', type=int, default=2000,
+                        help='Extra global names in the table (default: 2000)')
+    args = parser.parse_args()
+
+    manifest = build(args.out, text_size=int(args.text_mb * (1 << 20)),
+                     seed=args.seed, decoy_globals=args.decoy_globals)
+    print(f"Wrote {args.out} ({manifest['moduleSize']:,} byte image)")
+    for key, rva in manifest['addresses'].items():
+        print(f"  {key:30s} 0x{rva:x}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Synthetic Windswept Process Image
+
+Writes a sparse file laid out like the memory of a running Windswept.exe
+for one KNOWN_VERSIONS build (file offset == virtual address), so
+live_reader.py can be run and checked without the game:
+
+- The module's static GlobalData slot points at a CInstance whose +0x48
+  is a GMVarHashmap, filled with Robin Hood hashing exactly as
+  HashmapLookup in windswept.asl expects, among many decoy variables.
+- The variable index slots hold the keys of the tracked globals, each
+  after a pointer to its name, as in the game's global table.
+- Scalars (stageType, timer_Full, ...) are real RValues; the collectable
+  arrays are ArrayMetadata -> RValue arrays, with nested per-stage
+  arrays for comet shards and moon coins.
+
+FakeProcess can then change values, move arrays and grow the hashmap
+while a reader is attached, and write what it has so far as a Windows
+minidump for minidump_reader.py.
+
+Usage:
+    python synthetic_process.py out.mem [--md5 MD5] [--seed 1]
+                                [--minidump out.dmp [--memory-list]]
+"""
+
+import argparse
+import os
+import random
+import struct
+
+from extract_addresses import KNOWN_VERSIONS, VARIABLES
+from live_reader import BUCKET, CINSTANCE_HASHMAP, HASHMAP_HEADER, hash_key
+
+MODULE_BASE = 0x140000000
+HEAP_BASE = 0x200000000
+HEAP_SIZE = 64 << 20
+
+RVALUE = struct.Struct('<dII')
+RVALUE_PTR = struct.Struct('<QII')
+RVALUE_TYPE_REAL = 0
+RVALUE_TYPE_ARRAY = 2
+
+# Index key -> (array length, inner length or None) for array globals
+ARRAYS = {
+    'arrayStageClearIndex': (200, None),
+    'arrayCometCoinIndex': (100, None),
+    'arrayCloudCoinsIndex': (100, None),
+    'arrayCometShardIndex': (100, 5),
+    'arrayMoonCoinsIndex': (100, 5),
+}
+SCALARS = ('timerFullIndex', 'timerStopIndex', 'stageTypeIndex',
+           'frameCountRoomIndex')
+
+DEFAULT_MD5 = "1AFB64D60DECF8F5AA57F0BF3CE82F0B"  # 1.1.01 Hotfix 2 (Steam)
+
+PAGE_SIZE = 0x1000
+EXE_PATH = "C:\\Program Files (x86)\\Steam\\steamapps\\common\\Windswept\\Windswept.exe"
+
+# Minidump layout (see minidump_reader.py)
+MINIDUMP_HEADER = struct.Struct('<IIIIIIQ')
+MINIDUMP_DIRECTORY = struct.Struct('<III')
+MINIDUMP_MODULE = struct.Struct('<QIIII52x8x8x16x')
+
+
+class FakeProcess:
+    """A process image file for one KNOWN_VERSIONS build.
+
+    All writes go straight to the file, so a reader with it open sees
+    them on its next read.
+    """
+
+    def __init__(self, path, md5=DEFAULT_MD5, capacity=512, decoys=200,
+                 seed=1):
+        self.path = path
+        self.version = KNOWN_VERSIONS[md5]
+        self.module_base = MODULE_BASE
+        self.rnd = random.Random(seed)
+        self._brk = HEAP_BASE
+        self.pages = set()
+
+        with open(path, 'wb') as f:
+            f.truncate(HEAP_BASE + HEAP_SIZE)
+        self.fd = os.open(path, os.O_RDWR)
+
+        # Distinct variable keys for the tracked globals and the decoys
+        tracked = [k for k in SCALARS + tuple(ARRAYS) if k in self.version]
+        keys = self.rnd.sample(range(1, 20000), len(tracked) + decoys)
+        self.keys = dict(zip(tracked, keys))
+        var_names = {an: vn for vn, an in VARIABLES}
+        for name, key in self.keys.items():
+            string = self.alloc(len(var_names[name]) + 1)
+            self.write(string, var_names[name].encode('ascii') + b'\x00')
+            self.write(MODULE_BASE + self.version[name] - 8,
+                       struct.pack('<QiI', string, key, 0))
+
+        # RValues: one per tracked global plus the decoys
+        self.rvalues = {}
+        entries = []
+        for name, key in self.keys.items():
+            rvalue = self.alloc(RVALUE.size)
+            self.rvalues[name] = rvalue
+            if name in ARRAYS:
+                length, inner = ARRAYS[name]
+                self.write(rvalue, RVALUE_PTR.pack(
+                    self.new_array(length, inner), 0, RVALUE_TYPE_ARRAY))
+            else:
+                self.write(rvalue, RVALUE.pack(0.0, 0, RVALUE_TYPE_REAL))
+            entries.append((rvalue, key))
+        for key in keys[len(tracked):]:
+            rvalue = self.alloc(RVALUE.size)
+            self.write(rvalue, RVALUE.pack(self.rnd.random(), 0,
+                                           RVALUE_TYPE_REAL))
+            entries.append((rvalue, key))
+        self.entries = entries
+
+        self.instance = self.alloc(0x100)
+        self.hashmap = self.alloc(HASHMAP_HEADER.size)
+        self.write(self.instance + CINSTANCE_HASHMAP,
+                   struct.pack('<Q', self.hashmap))
+        self.write(MODULE_BASE + self.version['globalData'],
+                   struct.pack('<Q', self.instance))
+        self.rehash(capacity)
+        self.set_room(0)
+
+    def close(self):
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, address, data):
+        os.pwrite(self.fd, data, address)
+        self.pages.update(range(address // PAGE_SIZE,
+                                (address + len(data) - 1) // PAGE_SIZE + 1))
+
+    def alloc(self, size):
+        """Bump-allocate 16-byte aligned heap memory."""
+        address = self._brk
+        self._brk += -(-size // 16) * 16
+        if self._brk > HEAP_BASE + HEAP_SIZE:
+            raise MemoryError("fake heap exhausted")
+        return address
+
+    def new_array(self, length, inner=None):
+        """Allocate an ArrayMetadata of zeroed reals (or inner arrays)."""
+        meta = self.alloc(0x30)
+        data = self.alloc(length * RVALUE.size)
+        self.write(meta + 0x8, struct.pack('<Q', data))
+        self.write(meta + 0x18, struct.pack('<I', 1))
+        self.write(meta + 0x24, struct.pack('<i', length))
+        if inner is None:
+            self.write(data, RVALUE.pack(0.0, 0, RVALUE_TYPE_REAL) * length)
+        else:
+            self.write(data, b''.join(
+                RVALUE_PTR.pack(self.new_array(inner), 0, RVALUE_TYPE_ARRAY)
+                for _ in range(length)))
+        return meta
+
+    def rehash(self, capacity):
+        """Rebuild the bucket array at a new address with this capacity."""
+        mask = capacity - 1
+        buckets = [None] * capacity  # (value, key, hash)
+        for value, key in self.entries:
+            entry = (value, key, hash_key(key))
+            index, psl = entry[2] & mask, 0
+            while buckets[index] is not None:
+                other = buckets[index]
+                other_psl = (capacity - (mask & other[2]) + index) & mask
+                if other_psl < psl:
+                    buckets[index], entry, psl = entry, other, other_psl
+                index, psl = (index + 1) & mask, psl + 1
+            buckets[index] = entry
+
+        data = self.alloc(capacity * BUCKET.size)
+        self.write(data, b''.join(BUCKET.pack(*(b or (0, 0, 0)))
+                                  for b in buckets))
+        self.write(self.hashmap, HASHMAP_HEADER.pack(
+            capacity, len(self.entries), mask, capacity * 3 // 4, data))
+
+    def _array(self, name):
+        meta = struct.unpack('<Q', os.pread(self.fd, 8, self.rvalues[name]))[0]
+        return struct.unpack('<Q', os.pread(self.fd, 8, meta + 0x8))[0]
+
+    def set_room(self, room):
+        self.write(MODULE_BASE + self.version['room'], struct.pack('<i', room))
+
+    def set_value(self, name, value):
+        """Set a scalar global, e.g. set_value('stageTypeIndex', 4)."""
+        self.write(self.rvalues[name], struct.pack('<d', value))
+
+    def set_element(self, name, index, value, inner=None):
+        """Set array[index] (or array[index][inner] for nested arrays)."""
+        data = self._array(name)
+        if inner is not None:
+            meta = struct.unpack(
+                '<Q', os.pread(self.fd, 8, data + index * RVALUE.size))[0]
+            data = struct.unpack('<Q', os.pread(self.fd, 8, meta + 0x8))[0]
+            index = inner
+        self.write(data + index * RVALUE.size, struct.pack('<d', value))
+
+    def move_array(self, name):
+        """Reallocate an array (as GameMaker does on copy-on-write)."""
+        length, inner = ARRAYS[name]
+        old = self._array(name)
+        meta = self.new_array(length, inner)
+        new = struct.unpack('<Q', os.pread(self.fd, 8, meta + 0x8))[0]
+        if inner is None:
+            self.write(new, os.pread(self.fd, length * RVALUE.size, old))
+        self.write(self.rvalues[name], struct.pack('<Q', meta))
+
+    def write_minidump(self, path, memory64=True):
+        """Write every page written so far as a minidump of Windswept.exe.
+
+        memory64 writes a Memory64ListStream, as full-memory dumps have;
+        otherwise a MemoryListStream of separately placed ranges.
+        """
+        ranges = []
+        for page in sorted(self.pages):
+            if ranges and ranges[-1][1] == page:
+                ranges[-1][1] = page + 1
+            else:
+                ranges.append([page, page + 1])
+        ranges = [(first * PAGE_SIZE, (last - first) * PAGE_SIZE)
+                  for first, last in ranges]
+
+        name = EXE_PATH.encode('utf-16-le')
+        directory = MINIDUMP_HEADER.size
+        modules = directory + 2 * MINIDUMP_DIRECTORY.size
+        name_rva = modules + 4 + MINIDUMP_MODULE.size
+        memory = name_rva + 4 + len(name) + 2
+        if memory64:
+            memory_size = 16 + 16 * len(ranges)
+        else:
+            memory_size = 4 + 16 * len(ranges)
+        data_rva = memory + memory_size
+
+        out = bytearray(MINIDUMP_HEADER.pack(
+            0x504D444D, 0xA793, 2, directory, 0, 0, 0))
+        out += MINIDUMP_DIRECTORY.pack(4, name_rva - modules, modules)
+        out += MINIDUMP_DIRECTORY.pack(9 if memory64 else 5, memory_size,
+                                       memory)
+        out += struct.pack('<I', 1) + MINIDUMP_MODULE.pack(
+            self.module_base, self.version['moduleSize'], 0, 0, name_rva)
+        out += struct.pack('<I', len(name)) + name + b'\x00\x00'
+        if memory64:
+            out += struct.pack('<QQ', len(ranges), data_rva)
+            out += b''.join(struct.pack('<QQ', start, size)
+                            for start, size in ranges)
+        else:
+            out += struct.pack('<I', len(ranges))
+            rva = data_rva
+            for start, size in ranges:
+                out += struct.pack('<QII', start, size, rva)
+                rva += size
+        with open(path, 'wb') as f:
+            f.write(out)
+            for start, size in ranges:
+                f.write(os.pread(self.fd, size, start))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic Windswept process image")
+    parser.add_argument('out', help='Output image path (sparse)')
+    parser.add_argument('--md5', default=DEFAULT_MD5,
+                        help='KNOWN_VERSIONS build to lay out'
+                             f' (default: {DEFAULT_MD5})')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--minidump', metavar='PATH',
+                        help='Also write the image as a minidump')
+    parser.add_argument('--memory-list', action='store_true',
+                        help='Write the minidump\'s memory as a'
+                             ' MemoryListStream instead of Memory64ListStream')
+    args = parser.parse_args()
+
+    with FakeProcess(args.out, md5=args.md5, seed=args.seed) as proc:
+        print(f"Wrote {args.out} ({proc.version['name']})")
+        print(f"  module base  0x{proc.module_base:x}")
+        for name, key in proc.keys.items():
+            print(f"  {name:22s} key {key}")
+        if args.minidump:
+            proc.write_minidump(args.minidump, memory64=not args.memory_list)
+            print(f"Wrote {args.minidump}")
+
+
+if __name__ == '__main__':
+    main()